@@ -51,6 +51,8 @@ class ChangeCenterEvent(Component):
 
 
 class CollisionEvent(Event):
+    __slots__ = ("e1", "e2")
+
     def __init__(self, e1, e2):
         self.e1 = e1
         self.e2 = e2
@@ -3,6 +3,7 @@ import pygame.gfxdraw
 
 from triton.vector2d import Vector2d
 from triton.ecs.ecs import System
+from triton.broadphase import SweepAndPrune, sphere_collisions
 from triton.steering import pursuit, wander, arrive, truncate, evade_within
 
 from triton_ex.common.components import (
@@ -85,23 +86,32 @@ class RenderSystem(System):
 
 class CollisionCheckSystem(System):
     def initialize(self):
+        self.broadphase = SweepAndPrune()
+        self.collisions = self.registry.event_pool(CollisionEvent)
         self.on(TickEvent, self.tick)
 
     def tick(self, _):
-        for e1, (r, m) in self.registry.get_components(RigidBody, Movable):
-            for e2, (r2, m2) in self.registry.get_components(RigidBody, Movable):
-                if e1 < e2 and r.sphere.collides_with(r2.sphere):
-                    self.emit(CollisionEvent(e1, e2))
+        entities = []
+        spheres = []
+        for e, (r, m) in self.registry.get_components(RigidBody, Movable):
+            entities.append(e)
+            spheres.append(r.sphere)
+
+        for i, j in sphere_collisions(spheres, self.broadphase):
+            e1, e2 = entities[i], entities[j]
+            self.emit(self.collisions.acquire(min(e1, e2), max(e1, e2)))
 
 
 class CollisionSystem(System):
     def initialize(self):
-        self.on(CollisionEvent, self.on_collision)
-
-    def on_collision(self, c):
-        [r1] = self.registry.get_entity(c.e1, RigidBody)
-        [r2] = self.registry.get_entity(c.e2, RigidBody)
-        r1.sphere.resolve_collision(r2.sphere)
+        self.on(CollisionEvent, self.on_collisions, batch=True)
+
+    def on_collisions(self, collisions):
+        get_entity = self.registry.get_entity
+        for c in collisions:
+            [r1] = get_entity(c.e1, RigidBody)
+            [r2] = get_entity(c.e2, RigidBody)
+            r1.sphere.resolve_collision(r2.sphere)
 
 
 class ScreenBounceSystem(System):
@@ -0,0 +1,114 @@
+from timeit import default_timer as timer
+
+import numpy as np
+
+from triton.behavior import (
+    RUNNING,
+    SUCCESS,
+    BatchTree,
+    CompiledTree,
+    Node,
+    Parallel,
+    Selector,
+    Sequence,
+    Status,
+    VectorNode,
+)
+
+
+class Countdown(Node):
+    def __init__(self, column, **kwargs):
+        super().__init__(**kwargs)
+        self.column = column
+
+    def start(self, bb):
+        bb[self.column] = 3
+
+    def update(self, bb):
+        bb[self.column] -= 1
+        return Status.Running if bb[self.column] > 0 else Status.Success
+
+
+class Fail(Node):
+    def update(self, bb):
+        return Status.Failed
+
+
+class VectorCountdown(VectorNode):
+    def __init__(self, column, **kwargs):
+        super().__init__(**kwargs)
+        self.column = column
+
+    def start_batch(self, columns, agents):
+        columns[self.column][agents] = 3
+
+    def update_batch(self, columns, agents):
+        left = columns[self.column]
+        left[agents] -= 1
+        return np.where(left[agents] > 0, RUNNING, SUCCESS)
+
+
+def build(countdown=Countdown):
+    return Parallel(
+        children=[
+            Selector(children=[Fail(), Fail(), countdown("a")]),
+            Sequence(
+                children=[countdown("b"), Sequence(children=[countdown("c"), countdown("d")])]
+            ),
+        ]
+    )
+
+
+def bench_tick(n_agents, n_ticks=10):
+    """Ticks one tree for n_agents, with a blackboard dict and compiled to flat arrays"""
+    root = build()
+    bbs = [{} for _ in range(n_agents)]
+    start = timer()
+    for _ in range(n_ticks):
+        for bb in bbs:
+            root.tick(bb)
+    ticked = timer() - start
+
+    tree = CompiledTree(root)
+    states = [tree.new_state() for _ in range(n_agents)]
+    start = timer()
+    for _ in range(n_ticks):
+        for state in states:
+            tree.tick(state)
+    compiled = timer() - start
+
+    print(
+        "{:>6} agents: tree {:6.2f}us, compiled {:6.2f}us per agent tick".format(
+            n_agents, ticked / n_agents / n_ticks * 1e6, compiled / n_agents / n_ticks * 1e6
+        )
+    )
+
+
+def bench_batch(n_agents, n_ticks=10):
+    """Ticks one tree for a batch of n_agents, with per-agent and vectorized leaves"""
+    for countdown in (Countdown, VectorCountdown):
+        tree = BatchTree(build(countdown))
+        batch = tree.new_batch(n_agents, **{c: np.zeros(n_agents, int) for c in "abcd"})
+        start = timer()
+        for _ in range(n_ticks):
+            tree.tick_batch(batch)
+        elapsed = timer() - start
+        print(
+            "{:>6} agents, {:>15}: {:6.2f}us per agent tick".format(
+                n_agents, countdown.__name__, elapsed / n_agents / n_ticks * 1e6
+            )
+        )
+
+
+def main():
+    print("Single agent ticks")
+    for n in (1000, 10000):
+        bench_tick(n)
+
+    print("Batched ticks")
+    for n in (1000, 10000):
+        bench_batch(n)
+
+
+if __name__ == "__main__":
+    main()
@@ -55,12 +55,14 @@ house_rules.production(
     Cond("room", "temperature", "<", 20),
     Cond("room", "heater", "!=", True),
     production=enable_heater,
+    salience=10,
 )
 
 house_rules.production(
     Cond("room", "temperature", ">", 25),
     Cond("room", "heater", "==", True),
     production=disable_heater,
+    salience=10,
 )
 
 
@@ -0,0 +1,168 @@
+import os
+import tempfile
+from timeit import default_timer as timer
+
+from triton.rete import Rete, Cond, Fact, Var
+from triton.rete_shard import ShardedRete
+
+
+def noop(net, token):
+    pass
+
+
+def build(n_productions, n_attrs):
+    net = Rete()
+    for i in range(n_productions):
+        attr = "attr-{}".format(i % n_attrs)
+        net.production(Cond("x", attr, "==", i // n_attrs), production=noop)
+    return net
+
+
+def bench_alpha(n_productions, n_facts=10000, n_attrs=100):
+    """Every fact matches exactly one of n_productions equality tests"""
+    n_values = n_productions // n_attrs
+    start = timer()
+    net = build(n_productions, n_attrs)
+    built = timer() - start
+
+    start = timer()
+    for i in range(n_facts):
+        net.add_wme(Fact("obj-{}".format(i), "attr-{}".format(i % n_attrs), i % n_values))
+    added = timer() - start
+
+    print(
+        "{:>6} productions: build {:8.3f}s, {:6.2f}us per add_wme".format(
+            n_productions, built, added / n_facts * 1e6
+        )
+    )
+
+
+def bench_join(n_facts):
+    """Chains of blocks, joined on the block below being red"""
+    net = Rete()
+    net.production(Cond("x", "on", Var("y")), Cond("y", "color", "red"), production=noop)
+
+    start = timer()
+    for i in range(n_facts):
+        net.add_wme(Fact("block-{}".format(i), "on", "block-{}".format(i + 1)))
+    for i in range(0, n_facts, 10):
+        net.add_wme(Fact("block-{}".format(i), "color", "red"))
+    added = timer() - start
+    net.fire()
+
+    print(
+        "{:>6} facts: {:6.2f}us per add_wme".format(
+            n_facts, added / (n_facts + n_facts // 10) * 1e6
+        )
+    )
+
+
+def bench_batch(n_facts, n_updates=4):
+    """Every fact is updated n_updates times per tick, one by one and in a transaction"""
+    facts = [
+        Fact("obj-{}".format(i), "attr-{}".format(i % 100), u)
+        for u in range(n_updates)
+        for i in range(n_facts)
+    ]
+    for batched in (False, True):
+        net = build(1000, 100)
+        start = timer()
+        if batched:
+            net.add_wmes(facts)
+        else:
+            for fact in facts:
+                net.add_wme(fact)
+        net.fire()
+        print(
+            "{:>6} facts x {} updates, {:>8}: {:8.3f}s".format(
+                n_facts, n_updates, "add_wmes" if batched else "add_wme", timer() - start
+            )
+        )
+
+
+def bench_churn(n_facts, n_rounds=5, churn=0.1):
+    """Asserts n_facts joined facts, then retracts and re-asserts a fraction per round"""
+    net = Rete()
+    net.production(Cond("x", "on", Var("y")), Cond("y", "color", "red"), production=noop)
+    blocks = ["block-{}".format(i) for i in range(n_facts)]
+    net.add_wmes(Fact(b, "on", blocks[(i + 1) % n_facts]) for i, b in enumerate(blocks))
+    net.add_wmes(Fact(b, "color", "red") for b in blocks[::2])
+    net.fire()
+
+    step = int(1 / churn)
+    start = timer()
+    for r in range(n_rounds):
+        changed = blocks[r % step :: step]
+        net.retract_wmes(Fact(b, "color", "red") for b in changed)
+        net.add_wmes(Fact(b, "color", "red") for b in changed)
+        net.fire()
+    elapsed = timer() - start
+    n_changes = 2 * n_rounds * len(blocks[::step])
+    print("{:>6} facts: {:6.2f}us per add/retract".format(n_facts, elapsed / n_changes * 1e6))
+
+
+def bench_snapshot(n_facts):
+    """Compares building a network and its memories with loading a snapshot of it"""
+    start = timer()
+    net = Rete()
+    net.production(Cond("x", "on", Var("y")), Cond("y", "color", "red"), production=noop)
+    net.add_wmes(Fact("block-{}".format(i), "on", "block-{}".format(i + 1)) for i in range(n_facts))
+    net.add_wmes(Fact("block-{}".format(i), "color", "red") for i in range(0, n_facts, 2))
+    built = timer() - start
+
+    path = os.path.join(tempfile.mkdtemp(), "net.rete")
+    start = timer()
+    net.save(path)
+    saved = timer() - start
+    start = timer()
+    Rete.load(path)
+    loaded = timer() - start
+    os.remove(path)
+
+    print(
+        "{:>6} facts: build {:6.3f}s, save {:6.3f}s, load {:6.3f}s".format(
+            n_facts, built, saved, loaded
+        )
+    )
+
+
+def bench_sharded(n_facts, shards=(1, 2, 4)):
+    """Matches an id-local production in one network, then over worker processes"""
+    facts = [Fact("obj-{}".format(i), a, i % 7) for i in range(n_facts) for a in ("a", "b")]
+    for n in (0,) + shards:
+        net = ShardedRete(n) if n else Rete()
+        net.production(Cond("x", "a", ">", 2), Cond("x", "b", "<", 5), production=noop)
+        start = timer()
+        net.add_wmes(facts)
+        net.fire()
+        elapsed = timer() - start
+        if n:
+            net.close()
+        print("{:>6} facts, {} shards: {:8.3f}s".format(n_facts, n, elapsed))
+
+
+def main():
+    print("Alpha network, equality tests on 100 attributes")
+    for n in (100, 1000, 10000):
+        bench_alpha(n)
+
+    print("Beta network, one join")
+    for n in (1000, 10000, 100000):
+        bench_join(n)
+
+    print("Batched updates")
+    bench_batch(10000)
+
+    print("Churn, 10% of the facts retracted and re-added per round")
+    for n in (10000, 100000):
+        bench_churn(n)
+
+    print("Snapshots")
+    bench_snapshot(100000)
+
+    print("Sharded, 0 shards is a single network")
+    bench_sharded(100000)
+
+
+if __name__ == "__main__":
+    main()
@@ -69,11 +69,9 @@ def main():
         if random.randrange(1, 1000) == 1:
             center = Vector2d(random.random() * 400.0 + 200, random.random() * 400.0 + 200)
 
-        for i in range(0, len(spheres)):
-            sphere = spheres[i]
-            for neighbour in grid.nearby_objects(sphere):
-                if sphere.collides_with(neighbour):
-                    sphere.resolve_collision(neighbour)
+        for sphere, neighbour in grid.pairs():
+            if sphere.collides_with(neighbour):
+                sphere.resolve_collision(neighbour)
 
         for i in range(0, len(spheres)):
             sphere1 = spheres[i]
@@ -111,7 +111,7 @@ def main():
         if cursor.is_pressed():
             pos = pygame.mouse.get_pos()
             cursor.pos = Vector2d(pos[0], pos[1])
-            for neighbour in grid.nearby_objects(cursor):
+            for _, neighbour in grid.query_pairs(cursor):
                 if cursor.collides_with(neighbour):
                     cursor.resolve_collision(neighbour)
 
@@ -131,13 +131,16 @@ def main():
     while pygame.QUIT not in [e.type for e in pygame.event.get()]:
         grid.update(ships)
 
+        nearby_ships = {ship: [] for ship in ships}
+        for ship, neighbour in grid.pairs():
+            if ship.collides_with(neighbour):
+                nearby_ships[ship].append(neighbour)
+                nearby_ships[neighbour].append(ship)
+                calc_repulsive_force(ship, neighbour)
+                calc_repulsive_force(neighbour, ship)
+
         for ship in ships:
-            nearby_ships = []
-            for neighbour in grid.nearby_objects(ship):
-                if ship.collides_with(neighbour):
-                    nearby_ships.append(neighbour)
-                    calc_repulsive_force(ship, neighbour)
-            do_flock(ship, nearby_ships)
+            do_flock(ship, nearby_ships[ship])
             calc_wall_force(ship)
             calc_obstacle_force(ship, obstacles)
             calc_resistance(ship)
@@ -104,10 +104,9 @@ def main():
             mouse_sphere.pos = Vector2d(pos[0], pos[1])
 
         grid.update(spheres)
-        for sphere in spheres:
-            for neighbour in grid.nearby_objects(sphere):
-                if sphere.collides_with(neighbour):
-                    sphere.resolve_collision(neighbour)
+        for sphere, neighbour in grid.pairs():
+            if sphere.collides_with(neighbour):
+                sphere.resolve_collision(neighbour)
 
         for sphere in spheres:
             if sphere.y > 650 and sphere.vel.y > 0:
@@ -78,10 +78,9 @@ def main():
     while not pygame.QUIT in [e.type for e in pygame.event.get()]:
         grid.update(spheres)
 
-        for sphere in spheres:
-            for neighbour in grid.nearby_objects(sphere):
-                if sphere.collides_with(neighbour):
-                    sphere.resolve_collision(neighbour)
+        for sphere, neighbour in grid.pairs():
+            if sphere.collides_with(neighbour):
+                sphere.resolve_collision(neighbour)
 
         for sphere in spheres:
             fvect = center - sphere.pos
@@ -1 +1,4 @@
 from .behavior_tree import *
+from .compiled import SUCCESS, RUNNING, FAILED, AgentState, CompiledTree
+from .batch import Batch, BatchTree, VectorNode
+from .event import Blackboard, EventState, EventTree, Guard
@@ -0,0 +1,152 @@
+import numpy as np
+
+from .behavior_tree import Node
+from .compiled import CODES, FAILED, LEAF, PARALLEL, RUNNING, SELECTOR, SEQUENCE, SUCCESS
+from .compiled import CompiledTree
+
+
+class VectorNode(Node):
+    """A leaf updating a whole group of agents at once
+
+    update_batch gets the columns of the batch, a dict of NumPy arrays with a
+    row per agent, and the indices of the agents ticked at this leaf, and
+    returns an array with their statuses as SUCCESS, RUNNING or FAILED.
+    start_batch and end_batch get the agents starting and ending the leaf.
+    Such leaves can only be ticked by a BatchTree.
+    """
+
+    def start_batch(self, columns, agents):
+        pass
+
+    def update_batch(self, columns, agents):
+        raise NotImplementedError()
+
+    def end_batch(self, columns, agents):
+        pass
+
+
+class Batch(object):
+    """The state of a batch of agents in a BatchTree
+
+    slots is an (agents, slots) int64 array laid out like AgentState.slots,
+    data holds, per leaf that is not a VectorNode, a list with a dict per
+    agent, and columns the NumPy arrays handed to VectorNode leaves.
+    """
+
+    def __init__(self, slots, data, columns):
+        self.slots = slots
+        self.data = data
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.slots)
+
+
+class BatchTree(CompiledTree):
+    """Ticks a compiled tree for a batch of agents at once
+
+    Every node is ticked once per batch tick, for the group of agents that
+    reach it: sequences and selectors send each agent on to the child it is
+    running, parallels to the children still running. VectorNode leaves are
+    updated for their whole group in one call; other leaves are called per
+    agent. The statuses are the ones CompiledTree gives for every agent.
+
+    Usage:
+        tree = BatchTree(root)
+        batch = tree.new_batch(10000, distance=np.full(10000, 5.0))
+        statuses = tree.tick_batch(batch)
+    """
+
+    def __init__(self, root):
+        super().__init__(root)
+        for kind, children in zip(self.kinds, self.children):
+            assert kind != PARALLEL or len(children) < 63, "parallel with too many children"
+
+    def new_batch(self, n, **columns):
+        """Returns the state of n agents that have not been ticked yet
+
+        Args:
+            n: the number of agents
+            columns: NumPy arrays with a row per agent, for VectorNode leaves
+        """
+        slots = np.full((n, self.size), SUCCESS, dtype=np.int64)
+        data = [
+            None if isinstance(node, VectorNode) else [None] * n
+            for node, leaf in zip(self.nodes, self.leaves)
+            if leaf is not None
+        ]
+        return Batch(slots, data, columns)
+
+    def tick_batch(self, batch, agents=None):
+        """Ticks the tree for the agents of batch
+
+        Args:
+            batch: a Batch from new_batch
+            agents: the indices of the agents to tick, all when None
+
+        Returns:
+            an int array with the status of the root for every agent ticked
+        """
+        if agents is None:
+            agents = np.arange(len(batch))
+        return self._tick_batch(0, np.asarray(agents), batch)
+
+    def _tick_batch(self, n, agents, batch):
+        slots = batch.slots
+        kind = self.kinds[n]
+        previous = slots[agents, n]
+        if kind == LEAF:
+            node = self.nodes[n]
+            if isinstance(node, VectorNode):
+                node.start_batch(batch.columns, agents[previous != RUNNING])
+                status = np.asarray(node.update_batch(batch.columns, agents), dtype=np.int64)
+                node.end_batch(batch.columns, agents[status != RUNNING])
+            else:
+                data = batch.data[self.leaves[n]]
+                status = np.empty(len(agents), dtype=np.int64)
+                for i, agent in enumerate(agents.tolist()):
+                    user_data = data[agent]
+                    if user_data is None:
+                        user_data = data[agent] = {}
+                    if previous[i] != RUNNING:
+                        node.start(user_data)
+                    status[i] = code = CODES[node.update(user_data)]
+                    if code != RUNNING:
+                        node.end(user_data)
+
+        elif kind == SEQUENCE or kind == SELECTOR:
+            extra = self.extra[n]
+            index = np.where(previous != RUNNING, 0, slots[agents, extra])
+            proceed = SUCCESS if kind == SEQUENCE else FAILED
+            status = np.full(len(agents), SUCCESS, dtype=np.int64)
+            for k, child in enumerate(self.children[n]):
+                group = np.flatnonzero(index == k)
+                if len(group) == 0:
+                    continue
+                child_status = self._tick_batch(child, agents[group], batch)
+                status[group] = child_status
+                index[group[child_status == proceed]] += 1
+            slots[agents, extra] = index
+
+        elif kind == PARALLEL:
+            extra = self.extra[n]
+            children = self.children[n]
+            full = (1 << len(children)) - 1
+            running = np.where(previous != RUNNING, full, slots[agents, extra])
+            status = np.where(running == 0, SUCCESS, RUNNING)
+            for i, child in enumerate(children):
+                group = np.flatnonzero(running >> i & 1)
+                if len(group) == 0:
+                    continue
+                child_status = self._tick_batch(child, agents[group], batch)
+                status[group[child_status == FAILED]] = FAILED
+                running[group[child_status == SUCCESS]] &= ~(1 << i)
+            slots[agents, extra] = running
+
+        else:
+            for child in self.children[n]:
+                self._tick_batch(child, agents, batch)
+            status = np.full(len(agents), RUNNING, dtype=np.int64)
+
+        slots[agents, n] = status
+        return status
@@ -0,0 +1,157 @@
+from .behavior_tree import Node, Parallel, Repeater, Selector, Sequence, Status
+
+SUCCESS, RUNNING, FAILED = 0, 1, 2
+CODES = {Status.Success: SUCCESS, Status.Running: RUNNING, Status.Failed: FAILED}
+STATUSES = (Status.Success, Status.Running, Status.Failed)
+
+LEAF, SEQUENCE, SELECTOR, PARALLEL, REPEATER = range(5)
+_KINDS = ((Sequence, SEQUENCE), (Selector, SELECTOR), (Parallel, PARALLEL), (Repeater, REPEATER))
+
+
+def _kind(node):
+    """Returns the kind of a built-in composite, or LEAF for nodes ticked through their methods
+
+    Subclasses of the composites that override start, update or end keep
+    their own behavior, so they are run as leaves as well.
+    """
+    cls = type(node)
+    for composite, kind in _KINDS:
+        if isinstance(node, composite):
+            if (cls.start, cls.update, cls.end) == (composite.start, composite.update, Node.end):
+                return kind
+            break
+    return LEAF
+
+
+class AgentState(object):
+    """The state of one agent in a CompiledTree
+
+    slots holds the status of every node, followed by the child index of
+    sequences and selectors and the running children of parallels, as a
+    bitmask. data holds a dict per leaf, created the first time the leaf is
+    ticked and passed to its start, update and end.
+    """
+
+    __slots__ = ("slots", "data")
+
+    def __init__(self, slots, data):
+        self.slots = slots
+        self.data = data
+
+
+class CompiledTree(object):
+    """A behavior tree compiled to flat arrays indexed by integer node ids
+
+    The nodes are numbered in depth first order, with the root as 0. Sequences,
+    selectors, parallels and repeaters are run by the tree itself, from the
+    kinds, children and extra slot arrays; every other node is a leaf, and
+    ticked through its start, update and end methods. The state of an agent is
+    an AgentState, so ticking keeps no per-node dicts and slices no lists.
+    A tick gives the same statuses as ticking the root node with a blackboard.
+
+    Usage:
+        tree = CompiledTree(root)
+        states = [tree.new_state() for _ in range(10000)]
+        for state in states:
+            tree.tick(state)
+    """
+
+    def __init__(self, root):
+        self.nodes = []
+        self.kinds = []
+        self.children = []
+        self.extra = []
+        self.leaves = []
+        self.n_leaves = 0
+        self._add(root)
+
+        self.size = len(self.nodes)
+        for i, kind in enumerate(self.kinds):
+            if kind in (SEQUENCE, SELECTOR, PARALLEL):
+                self.extra[i] = self.size
+                self.size += 1
+        self.ids = {node: i for i, node in enumerate(self.nodes)}
+
+    def _add(self, node):
+        i = len(self.nodes)
+        kind = self.kind_of(node)
+        self.nodes.append(node)
+        self.kinds.append(kind)
+        self.children.append(())
+        self.extra.append(None)
+        if kind == LEAF:
+            self.leaves.append(self.n_leaves)
+            self.n_leaves += 1
+        else:
+            self.leaves.append(None)
+            self.children[i] = tuple(self._add(child) for child in node.children)
+        return i
+
+    def kind_of(self, node):
+        """Returns the kind node is compiled to"""
+        return _kind(node)
+
+    def new_state(self):
+        """Returns the state of an agent that has not been ticked yet"""
+        return AgentState([SUCCESS] * self.size, [None] * self.n_leaves)
+
+    def status(self, state, node):
+        """Returns the status node got in its last tick"""
+        return STATUSES[state.slots[self.ids[node]]]
+
+    def tick(self, state):
+        """Ticks the tree for one agent and returns the status of the root"""
+        return STATUSES[self._tick(0, state.slots, state.data)]
+
+    def _tick(self, n, slots, data):
+        kind = self.kinds[n]
+        previous = slots[n]
+        if kind == LEAF:
+            node = self.nodes[n]
+            leaf = self.leaves[n]
+            user_data = data[leaf]
+            if user_data is None:
+                user_data = data[leaf] = {}
+            if previous != RUNNING:
+                node.start(user_data)
+            status = CODES[node.update(user_data)]
+            if status != RUNNING:
+                node.end(user_data)
+
+        elif kind == SEQUENCE or kind == SELECTOR:
+            extra = self.extra[n]
+            index = 0 if previous != RUNNING else slots[extra]
+            proceed = SUCCESS if kind == SEQUENCE else FAILED
+            children = self.children[n]
+            status = SUCCESS
+            while index < len(children):
+                status = self._tick(children[index], slots, data)
+                if status != proceed:
+                    break
+                index += 1
+            slots[extra] = index
+
+        elif kind == PARALLEL:
+            extra = self.extra[n]
+            children = self.children[n]
+            running = (1 << len(children)) - 1 if previous != RUNNING else slots[extra]
+            if not running:
+                status = SUCCESS
+            else:
+                status = RUNNING
+                for i, child in enumerate(children):
+                    if running >> i & 1:
+                        child_status = self._tick(child, slots, data)
+                        if child_status == FAILED:
+                            status = FAILED
+                        elif child_status == SUCCESS:
+                            running &= ~(1 << i)
+            slots[extra] = running
+
+        else:
+            for child in self.children[n]:
+                self._tick(child, slots, data)
+            status = RUNNING
+
+        slots[n] = status
+        return status
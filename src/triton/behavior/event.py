@@ -0,0 +1,331 @@
+from .behavior_tree import Composite
+from .compiled import FAILED, LEAF, PARALLEL, REPEATER, RUNNING, SELECTOR, SEQUENCE, SUCCESS
+from .compiled import STATUSES, AgentState, CompiledTree
+
+GUARD = REPEATER + 1
+
+
+class Guard(Composite):
+    """A decorator running its child while condition(blackboard) holds
+
+    The condition must only read the blackboard keys listed in keys. When an
+    EventTree sees one of them change, it evaluates the condition again and
+    aborts running nodes according to abort:
+
+        - "self": the running child is aborted when the condition fails
+        - "lower": when the condition holds again, the lower priority
+          children of the selector the guard is a child of are aborted,
+          and the selector resumes at the guard
+        - "both": both of the above
+        - "none": the condition is only evaluated when the guard is ticked
+
+    Aborted leaves get their end called. Guards are only run by EventTree.
+
+    Usage:
+        Selector(children=[
+            Guard(lambda bb: bb["enemy"], Attack(), keys=["enemy"], abort="both"),
+            Patrol(),
+        ])
+    """
+
+    ABORTS = ("none", "self", "lower", "both")
+
+    def __init__(self, condition, child, keys=(), abort="self", **kwargs):
+        assert abort in self.ABORTS
+        super(Guard, self).__init__(children=[child], **kwargs)
+        self.condition = condition
+        self.keys = tuple(keys)
+        self.abort = abort
+
+    def update(self, bb):
+        raise NotImplementedError("guards are only run by EventTree")
+
+
+class Blackboard(dict):
+    """A dict remembering the keys changed since an EventTree last looked
+
+    Every method of dict that adds, assigns or removes keys records them.
+    """
+
+    __slots__ = ("changed",)
+
+    def __init__(self, *args, **kwargs):
+        super(Blackboard, self).__init__(*args, **kwargs)
+        self.changed = set()
+
+    def __setitem__(self, key, value):
+        super(Blackboard, self).__setitem__(key, value)
+        self.changed.add(key)
+
+    def __delitem__(self, key):
+        super(Blackboard, self).__delitem__(key)
+        self.changed.add(key)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key in self:
+            self.changed.add(key)
+        return super(Blackboard, self).pop(key, *default)
+
+    def popitem(self):
+        key, value = super(Blackboard, self).popitem()
+        self.changed.add(key)
+        return key, value
+
+    def clear(self):
+        self.changed.update(self)
+        super(Blackboard, self).clear()
+
+
+class EventState(AgentState):
+    """The state of one agent in an EventTree
+
+    Besides the slots and leaf data of AgentState, it holds the blackboard of
+    the agent and the running path: the nodes to tick to resume the tree,
+    and, per such node, the parallels whose running nodes end with it.
+    """
+
+    __slots__ = ("blackboard", "frontier", "closers")
+
+    def __init__(self, slots, data, blackboard):
+        super(EventState, self).__init__(slots, data)
+        self.blackboard = blackboard
+        self.frontier = []
+        self.closers = []
+
+
+class EventTree(CompiledTree):
+    """A compiled behavior tree that resumes at its running nodes
+
+    After a tick, the tree remembers the running path of the agent. The next
+    tick goes straight to the running leaves, and to the children of
+    repeaters that are not running, instead of walking down from the root.
+    Only when one of them completes are its ancestors evaluated again, in
+    the order a tick from the root would. A tick from the root is done when
+    the tree is not running, or when a change to a blackboard key that a
+    Guard subscribes to makes it abort.
+
+    Leaves get their own dict, holding the blackboard of the agent as
+    "blackboard". The statuses and calls are the ones of CompiledTree.
+
+    Usage:
+        tree = EventTree(root)
+        state = tree.new_state({"enemy": False})
+        tree.tick(state)
+        state.blackboard["enemy"] = True
+        tree.tick(state)
+    """
+
+    def __init__(self, root):
+        super(EventTree, self).__init__(root)
+        self.parents = [None] * len(self.nodes)
+        self.positions = [None] * len(self.nodes)
+        self.ends = [None] * len(self.nodes)
+        self.subscribers = {}
+        for n in reversed(range(len(self.nodes))):
+            end = n + 1
+            for position, child in enumerate(self.children[n]):
+                self.parents[child] = n
+                self.positions[child] = position
+                end = max(end, self.ends[child])
+            self.ends[n] = end
+            if self.kinds[n] == GUARD:
+                for key in self.nodes[n].keys:
+                    self.subscribers.setdefault(key, []).append(n)
+        self.stats = {"full": 0, "resumed": 0, "aborts": 0}
+        self._blackboard = None
+
+    def kind_of(self, node):
+        if isinstance(node, Guard):
+            return GUARD
+        return super(EventTree, self).kind_of(node)
+
+    def new_state(self, blackboard=None):
+        """Returns the state of an agent that has not been ticked yet
+
+        Args:
+            blackboard: the initial contents of the blackboard of the agent
+        """
+        blackboard = Blackboard(blackboard or {})
+        data = [{"blackboard": blackboard} for _ in range(self.n_leaves)]
+        return EventState([SUCCESS] * self.size, data, blackboard)
+
+    def tick(self, state):
+        """Ticks the tree for one agent and returns the status of the root"""
+        self._blackboard = blackboard = state.blackboard
+        slots, data = state.slots, state.data
+        aborted = False
+        if blackboard.changed:
+            aborted = self._check_guards(state, blackboard.changed)
+            blackboard.changed.clear()
+
+        if aborted or not state.frontier:
+            self.stats["full"] += 1
+            self._tick(0, slots, data)
+            self._find_path(state)
+        else:
+            self.stats["resumed"] += 1
+            if self._resume(state):
+                self._find_path(state)
+        return STATUSES[slots[0]]
+
+    def _check_guards(self, state, keys):
+        """Applies the aborts of the guards subscribed to keys
+
+        Returns:
+            True when a tick from the root is needed
+        """
+        slots, data = state.slots, state.data
+        guards = set()
+        for key in keys:
+            guards.update(self.subscribers.get(key, ()))
+
+        aborted = False
+        for n in sorted(guards):
+            guard = self.nodes[n]
+            if guard.abort == "none":
+                continue
+            holds = guard.condition(state.blackboard)
+            if slots[n] == RUNNING:
+                if not holds and guard.abort in ("self", "both"):
+                    aborted = True
+                continue
+
+            parent = self.parents[n]
+            if (
+                holds
+                and guard.abort in ("lower", "both")
+                and parent is not None
+                and self.kinds[parent] == SELECTOR
+                and slots[parent] == RUNNING
+                and slots[self.extra[parent]] > self.positions[n]
+            ):
+                running = self.children[parent][slots[self.extra[parent]]]
+                self._abort(running, slots, data)
+                slots[self.extra[parent]] = self.positions[n]
+                aborted = True
+        return aborted
+
+    def _abort(self, n, slots, data):
+        """Ends the running leaves below n and marks the running nodes as failed"""
+        self.stats["aborts"] += 1
+        for m in range(n, self.ends[n]):
+            if slots[m] == RUNNING:
+                if self.kinds[m] == LEAF:
+                    self.nodes[m].end(data[self.leaves[m]])
+                slots[m] = FAILED
+
+    def _tick(self, n, slots, data):
+        if self.kinds[n] != GUARD:
+            return super(EventTree, self)._tick(n, slots, data)
+
+        child = self.children[n][0]
+        if self.nodes[n].condition(self._blackboard):
+            status = self._tick(child, slots, data)
+        else:
+            if slots[n] == RUNNING:
+                self._abort(child, slots, data)
+            status = FAILED
+        slots[n] = status
+        return status
+
+    def _find_path(self, state):
+        """Collects the nodes a tick from the root would reach first, below running nodes"""
+        slots = state.slots
+        frontier, closers = [], []
+
+        def walk(n):
+            kind = self.kinds[n]
+            children = self.children[n]
+            if kind == SEQUENCE or kind == SELECTOR:
+                walk(children[slots[self.extra[n]]])
+            elif kind == GUARD:
+                walk(children[0])
+            elif kind == PARALLEL and slots[self.extra[n]]:
+                running = slots[self.extra[n]]
+                for i, child in enumerate(children):
+                    if running >> i & 1:
+                        walk(child)
+                closers[-1].append(n)
+            elif kind == REPEATER:
+                for child in children:
+                    if slots[child] == RUNNING:
+                        walk(child)
+                    else:
+                        frontier.append(child)
+                        closers.append([])
+            else:
+                frontier.append(n)
+                closers.append([])
+
+        if slots[0] == RUNNING:
+            walk(0)
+        state.frontier, state.closers = frontier, closers
+
+    def _resume(self, state):
+        """Ticks the running path, evaluating the ancestors of the nodes that complete
+
+        Returns:
+            True when the running path changed
+        """
+        slots, data = state.slots, state.data
+        failed = set()
+        changed = False
+        for n, closers in zip(state.frontier, state.closers):
+            status = self._tick(n, slots, data)
+            parent = self.parents[n]
+            if status != RUNNING:
+                changed = True
+                self._complete(n, status, slots, data, failed)
+            elif parent is not None and self.kinds[parent] == REPEATER:
+                changed = True
+            for parallel in closers:
+                if parallel in failed:
+                    slots[parallel] = FAILED
+                    self._complete(parallel, FAILED, slots, data, failed)
+        return changed
+
+    def _complete(self, n, status, slots, data, failed):
+        """Hands the status n completed with to its ancestors, as long as they complete too"""
+        while True:
+            parent = self.parents[n]
+            if parent is None:
+                return
+            kind = self.kinds[parent]
+            if kind == PARALLEL:
+                if status == FAILED:
+                    failed.add(parent)
+                else:
+                    slots[self.extra[parent]] &= ~(1 << self.positions[n])
+                return
+            if kind == REPEATER:
+                return
+
+            if kind == SEQUENCE or kind == SELECTOR:
+                proceed = SUCCESS if kind == SEQUENCE else FAILED
+                children = self.children[parent]
+                index = self.positions[n]
+                if status == proceed:
+                    index += 1
+                    while index < len(children):
+                        status = self._tick(children[index], slots, data)
+                        if status != proceed:
+                            break
+                        index += 1
+                slots[self.extra[parent]] = index
+            slots[parent] = status
+            if status == RUNNING:
+                return
+            n = parent
@@ -0,0 +1,139 @@
+import numpy as np
+
+from triton.integrator import Integrator
+
+
+class BodyArray(object):
+    """Structure-of-arrays storage for rigid bodies
+
+    Each body occupies one row in a set of NumPy columns. The state matrix
+    has the same layout as RigidBody2d._state, (dx, dy, dtheta, x, y, theta),
+    so that all bodies can be integrated with a single vectorized RK4 pass.
+
+    Bodies added to the array are bound to their row and keep working as
+    before; reads and writes through the RigidBody2d properties go straight
+    to the columns.
+
+    Usage:
+        bodies = BodyArray()
+        bodies.add(Sphere(mass=1.0, radius=2.0))
+        bodies.update(t, dt)
+    """
+
+    def __init__(self, capacity=64):
+        self._bodies = []
+        self._allocate(max(1, capacity))
+
+    def _allocate(self, capacity):
+        size = len(self._bodies)
+        columns = {
+            "state": np.zeros((capacity, 6)),
+            "mass": np.ones(capacity),
+            "inertia": np.ones(capacity),
+            "damping": np.zeros(capacity),
+            "force": np.zeros((capacity, 2)),
+            "torque": np.zeros(capacity),
+            "gravity": np.zeros((capacity, 2)),
+        }
+        for name, column in columns.items():
+            if hasattr(self, name):
+                column[:size] = getattr(self, name)[:size]
+            setattr(self, name, column)
+
+        for index, body in enumerate(self._bodies):
+            body._bind(self, index)
+
+    def __len__(self):
+        return len(self._bodies)
+
+    def __iter__(self):
+        return iter(self._bodies)
+
+    def __getitem__(self, index):
+        return self._bodies[index]
+
+    @property
+    def capacity(self):
+        return len(self.mass)
+
+    def add(self, body):
+        """Moves the state of a body into the array and binds it to a row
+
+        Args:
+            RigidBody2d body
+        Returns:
+            the row index of the body
+        """
+        if body._array is not None:
+            raise ValueError("Body %s is already part of a BodyArray" % repr(body))
+
+        index = len(self._bodies)
+        if index == self.capacity:
+            self._allocate(2 * self.capacity)
+
+        self.state[index] = body._state[:]
+        self.mass[index] = body._mass
+        self.inertia[index] = body._inertia
+        self.damping[index] = body._damping
+        self.force[index] = body._applied_force[:]
+        self.torque[index] = body._applied_torque
+        self.gravity[index] = body._gravity[0], body._gravity[1]
+
+        self._bodies.append(body)
+        body._bind(self, index)
+        return index
+
+    def remove(self, body):
+        """Removes a body from the array
+
+        The body gets its own storage back, and the last row is moved into
+        the vacated slot.
+        """
+        index = body._index
+        if body._array is not self:
+            raise ValueError("Body %s is not part of this BodyArray" % repr(body))
+
+        body._unbind()
+        last = len(self._bodies) - 1
+        moved = self._bodies.pop()
+        if index != last:
+            for column in (
+                self.state,
+                self.mass,
+                self.inertia,
+                self.damping,
+                self.force,
+                self.torque,
+                self.gravity,
+            ):
+                column[index] = column[last]
+            self._bodies[index] = moved
+            moved._bind(self, index)
+
+    def _accel(self, time, state):
+        n = len(state)
+        damping = self.damping[:n]
+        accel = np.empty_like(state)
+        accel[:, 0:2] = (
+            (1 / self.mass[:n])[:, None] * self.force[:n]
+            - damping[:, None] * state[:, 0:2]
+            - self.gravity[:n]
+        )
+        accel[:, 2] = 1 / self.inertia[:n] * self.torque[:n] - damping * state[:, 2]
+        accel[:, 3:6] = state[:, 0:3]
+        return accel
+
+    def update(self, time, time_slice):
+        """Integrates every body in the array and clears applied forces
+
+        Args:
+            time: current simulation time
+            time_slice: length of the step
+        """
+        n = len(self._bodies)
+        if n == 0:
+            return
+        t, state = Integrator.rk4(time, time_slice, self.state[:n], self._accel)
+        self.state[:n] = state
+        self.force[:n] = 0
+        self.torque[:n] = 0
@@ -0,0 +1,156 @@
+import numpy as np
+
+from triton.spatial_hash import SpatialHash
+
+
+def body_bounds(bodies):
+    """Collects positions and radii of a sequence of spheres into arrays
+
+    Args:
+        bodies: a sequence of objects with pos and radius attributes
+    Returns:
+        (positions, radii) as arrays of shape (n, 2) and (n,)
+    """
+    n = len(bodies)
+    positions = np.empty((n, 2))
+    radii = np.empty(n)
+    for i, body in enumerate(bodies):
+        pos = body.pos
+        positions[i, 0] = pos[0]
+        positions[i, 1] = pos[1]
+        radii[i] = body.radius
+    return positions, radii
+
+
+def _empty_pairs():
+    return np.empty((0, 2), dtype=np.intp)
+
+
+class SweepAndPrune(object):
+    """Sort-and-sweep broad phase along the x axis
+
+    Bounds are sorted on their lower x coordinate; every bound is then paired
+    with the bounds whose lower x falls before its upper x. The candidates are
+    finally pruned on y overlap. All steps are vectorized.
+    """
+
+    def find_pairs(self, positions, radii):
+        """Finds pairs of bodies with overlapping bounding boxes
+
+        Args:
+            positions: array of shape (n, 2)
+            radii: array of shape (n,)
+        Returns:
+            array of shape (k, 2) with index pairs, i < j in each row
+        """
+        n = len(radii)
+        if n < 2:
+            return _empty_pairs()
+
+        lower = positions[:, 0] - radii
+        upper = positions[:, 0] + radii
+        order = np.argsort(lower, kind="stable")
+        lower_sorted = lower[order]
+
+        # for each bound in sort order, bounds [start, end) overlap on x
+        start = np.arange(1, n)
+        end = np.searchsorted(lower_sorted, upper[order[:-1]], side="right")
+        counts = np.maximum(end - start, 0)
+        total = counts.sum()
+        if total == 0:
+            return _empty_pairs()
+
+        first = np.repeat(np.arange(n - 1), counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        second = np.repeat(start, counts) + offsets
+
+        i = order[first]
+        j = order[second]
+        reach = radii[i] + radii[j]
+        overlap = np.abs(positions[i, 1] - positions[j, 1]) <= reach
+        pairs = np.stack((np.minimum(i, j), np.maximum(i, j)), axis=1)[overlap]
+        return pairs
+
+
+class _Bounds(object):
+    def __init__(self, index, pos, radius):
+        self.index = index
+        self.pos = pos
+        self.radius = radius
+
+
+class SpatialHashBroadPhase(object):
+    """Broad phase backed by a SpatialHash
+
+    Performs better than sort-and-sweep when bodies are spread out evenly
+    along the x axis, and the grid size matches the typical body size.
+    """
+
+    def __init__(self, grid_size=70):
+        self._grid = SpatialHash(grid_size=grid_size)
+        self._bounds = []
+
+    def find_pairs(self, positions, radii):
+        """Finds pairs of bodies sharing a grid cell with overlapping bounding boxes
+
+        Args:
+            positions: array of shape (n, 2)
+            radii: array of shape (n,)
+        Returns:
+            array of shape (k, 2) with index pairs, i < j in each row
+        """
+        n = len(radii)
+        bounds = self._bounds
+        while len(bounds) < n:
+            bounds.append(_Bounds(len(bounds), None, 0.0))
+        del bounds[n:]
+
+        # the bounds are reused between calls so the grid only has to move
+        # the bodies that changed cells
+        for b, pos, radius in zip(bounds, positions.tolist(), radii.tolist()):
+            b.pos = pos
+            b.radius = radius
+        self._grid.update(bounds)
+
+        pairs = [(a.index, b.index) for a, b in self._grid.pairs()]
+        if not pairs:
+            return _empty_pairs()
+        pairs = np.array(pairs, dtype=np.intp)
+        pairs.sort(axis=1)
+        return pairs
+
+
+def sphere_contacts(positions, radii, pairs):
+    """Narrow phase test for spheres
+
+    Args:
+        positions: array of shape (n, 2)
+        radii: array of shape (n,)
+        pairs: candidate index pairs of shape (k, 2)
+    Returns:
+        the rows of pairs where the spheres touch or overlap
+    """
+    if len(pairs) == 0:
+        return pairs
+    i, j = pairs[:, 0], pairs[:, 1]
+    delta = positions[j] - positions[i]
+    reach = radii[i] + radii[j]
+    return pairs[np.einsum("ij,ij->i", delta, delta) <= reach * reach]
+
+
+def sphere_collisions(bodies, broadphase=None):
+    """Finds all pairs of colliding spheres
+
+    Args:
+        bodies: a sequence of objects with pos and radius attributes
+        broadphase: SweepAndPrune (default) or SpatialHashBroadPhase instance
+    Returns:
+        array of shape (k, 2) with indices into bodies, i < j in each row
+    Usage:
+        for i, j in sphere_collisions(spheres):
+            spheres[i].resolve_collision(spheres[j])
+    """
+    if broadphase is None:
+        broadphase = SweepAndPrune()
+    positions, radii = body_bounds(bodies)
+    return sphere_contacts(positions, radii, broadphase.find_pairs(positions, radii))
@@ -1,110 +1,379 @@
+import threading
+
+from triton.timer import profiler, timer
+from triton.ecs.numeric import NumericColumn, numeric_component, is_numeric_component
+from triton.ecs.scheduler import Scheduler
+
+
 class Event(object):
-    pass
+    """Base class for events
+
+    Subclasses sent in large numbers can declare __slots__ to keep instances
+    small, and be recycled through an EventPool.
+    """
+
+    __slots__ = ()
 
 
 class Component(object):
     pass
 
 
+class EventPool(object):
+    """Recycles instances of an event type
+
+    Events acquired from a pool registered with Registry.event_pool are
+    returned to the pool once every subscribed system has processed them,
+    so they must not be kept by listeners. Systems in a parallel stage of
+    the Scheduler share the pool, so it is guarded by a lock.
+
+    Usage:
+        pool = registry.event_pool(CollisionEvent)
+        system.emit(pool.acquire(e1, e2))
+    """
+
+    def __init__(self, etype):
+        self.etype = etype
+        self._free = []
+        self._refs = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, *args, **kwargs):
+        with self._lock:
+            einstance = self._free.pop() if self._free else None
+        if einstance is None:
+            return self.etype(*args, **kwargs)
+        einstance.__init__(*args, **kwargs)
+        return einstance
+
+    def release(self, einstance):
+        with self._lock:
+            self._free.append(einstance)
+
+    def _hold(self, einstance, refs):
+        if refs == 0:
+            self.release(einstance)
+        else:
+            with self._lock:
+                self._refs[id(einstance)] = refs
+
+    def _done(self, einstance):
+        key = id(einstance)
+        with self._lock:
+            refs = self._refs[key] - 1
+            if refs == 0:
+                del self._refs[key]
+                self._free.append(einstance)
+            else:
+                self._refs[key] = refs
+
+
 class System(object):
+    # component types the system reads and writes, used by the Scheduler;
+    # None means the system may touch anything and has to run on its own
+    reads = None
+    writes = None
+    kernel = None
+    _outbox = None
+
     def __init__(self):
         self.registry = None
         self.listeners = {}
+        self.batch_listeners = {}
         self.events = []
 
     def initialize(self):
         raise NotImplementedError(self.__class__)
 
-    def on(self, event, callback):
-        if event not in self.listeners:
-            self.listeners[event] = []
-        self.listeners[event].append(callback)
+    def on(self, event, callback, batch=False):
+        """Registers a callback for an event type
+
+        Args:
+            event: the event type
+            callback: called with each event, or with a list of all events of
+                the type received since the last tick when batch is True
+        """
+        listeners = self.batch_listeners if batch else self.listeners
+        if event not in listeners:
+            listeners[event] = []
+        listeners[event].append(callback)
+        self.listeners.setdefault(event, [])
+        if self.registry is not None:
+            self.registry._subscribe(event, self)
 
     def _receive(self, etype, einstance):
-        if etype not in self.listeners:
-            return
         self.events.append((etype, einstance))
 
     def emit(self, einstance):
-        self.registry._propagate_event(einstance)
+        if self._outbox is not None:
+            self._outbox.append(einstance)
+        else:
+            self.registry._propagate_event(einstance)
 
     def _process(self):
         event_queue = self.events
+        if not event_queue:
+            return
+        start = timer() if profiler.enabled else None
         self.events = []
+        listeners = self.listeners
+        batch_listeners = self.batch_listeners
+        batches = {}
         for etype, einst in event_queue:
-            for listener in self.listeners[etype]:
+            for listener in listeners[etype]:
                 listener(einst)
+            if etype in batch_listeners:
+                batches.setdefault(etype, []).append(einst)
+
+        for etype, batch in batches.items():
+            for listener in batch_listeners[etype]:
+                listener(batch)
+
+        pools = self.registry._pools if self.registry is not None else None
+        if pools:
+            for etype, einst in event_queue:
+                pool = pools.get(etype)
+                if pool is not None:
+                    pool._done(einst)
+
+        if start is not None:
+            label = "system." + self.__class__.__name__
+            profiler.record(label, start)
+            profiler.count(label + ".events", len(event_queue))
+
+
+class Archetype(object):
+    """Table of all entities sharing the same set of component types
+
+    Components are stored column-wise, one list per component type, and
+    entity rows are kept dense by moving the last row into a removed slot.
+    Numeric components get a NumericColumn with packed field arrays.
+    """
+
+    def __init__(self, signature):
+        self.signature = signature
+        self.entities = []
+        self.rows = {}
+        self.columns = {t: NumericColumn(t) if is_numeric_component(t) else [] for t in signature}
+
+    def __len__(self):
+        return len(self.entities)
+
+    def add(self, entity, components):
+        self.rows[entity] = len(self.entities)
+        self.entities.append(entity)
+        for comp_type, column in self.columns.items():
+            column.append(components[comp_type])
+
+    def remove(self, entity):
+        row = self.rows.pop(entity)
+        last = self.entities.pop()
+        components = {}
+        for comp_type, column in self.columns.items():
+            tail = column.pop()
+            if last == entity:
+                components[comp_type] = tail
+            else:
+                components[comp_type] = column[row]
+                column[row] = tail
+        if last != entity:
+            self.entities[row] = last
+            self.rows[last] = row
+        return components
+
+    def get(self, entity, comp_type):
+        column = self.columns.get(comp_type)
+        if column is None:
+            return None
+        return column[self.rows[entity]]
+
+
+class Query(object):
+    """Cached view over the archetypes having all of the given component types
+
+    The registry appends newly created archetypes to the queries they match,
+    so iterating a query never has to look at entities it will not yield.
+    """
+
+    def __init__(self, types):
+        self.types = types
+        self.signature = frozenset(types)
+        self.archetypes = []
+
+    def matches(self, archetype):
+        return self.signature <= archetype.signature
+
+    def entities(self):
+        for archetype in self.archetypes:
+            yield from archetype.entities
+
+    def batches(self):
+        """Yields a ColumnBatch for every non-empty matching archetype"""
+        for archetype in self.archetypes:
+            if archetype:
+                yield ColumnBatch(archetype, self.types)
+
+    def __iter__(self):
+        types = self.types
+        # snapshot the rows so systems may add and remove components while iterating
+        rows = [list(zip(a.entities, *[a.columns[t] for t in types])) for a in self.archetypes if a]
+        for chunk in rows:
+            for ent, *comps in chunk:
+                yield ent, comps
+
+
+class ColumnBatch(object):
+    """Column access to the entities of one archetype
+
+    Indexing a batch with a numeric component type gives the field arrays of
+    that component, as views into the archetype storage; other component
+    types give the list of component objects. The views are only valid until
+    components are next added to or removed from the registry.
+
+    Usage:
+        for batch in registry.get_columns(Position, Velocity):
+            pos, vel = batch[Position], batch[Velocity]
+            pos.x += vel.x * dt
+    """
+
+    def __init__(self, archetype, types):
+        self.entities = archetype.entities
+        self._columns = {}
+        for t in types:
+            column = archetype.columns[t]
+            self._columns[t] = column.arrays() if isinstance(column, NumericColumn) else column
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __getitem__(self, comp_type):
+        return self._columns[comp_type]
 
 
 class Registry:
     def __init__(self):
         self._entities = {}
-        self._components = {}
+        self._archetypes = {}
+        self._queries = {}
         self._entity_id = 0
         self._systems = []
+        self._subscribers = {}
+        self._pools = {}
+        self.scheduler = None
 
     def _propagate_event(self, einstance):
         etype = type(einstance)
-        for system in self._systems:
+        subscribers = self._subscribers.get(etype, ())
+        for system in subscribers:
             system._receive(etype, einstance)
+        if profiler.enabled:
+            profiler.count("event." + etype.__name__, len(subscribers))
+        pool = self._pools.get(etype)
+        if pool is not None:
+            pool._hold(einstance, len(subscribers))
+
+    def _subscribe(self, etype, system):
+        subscribers = self._subscribers.setdefault(etype, [])
+        if system not in subscribers:
+            subscribers.append(system)
+            # deliver in the order the systems were added
+            subscribers.sort(key=self._systems.index)
+
+    def event_pool(self, etype):
+        """Returns the EventPool recycling events of type etype"""
+        pool = self._pools.get(etype)
+        if pool is None:
+            pool = self._pools[etype] = EventPool(etype)
+        return pool
 
     def add_system(self, system):
         system.registry = self
         self._systems.append(system)
         system.initialize()
+        for etype in system.listeners:
+            self._subscribe(etype, system)
         return system
 
+    def _archetype(self, signature):
+        archetype = self._archetypes.get(signature)
+        if archetype is None:
+            archetype = self._archetypes[signature] = Archetype(signature)
+            for query in self._queries.values():
+                if query.matches(archetype):
+                    query.archetypes.append(archetype)
+        return archetype
+
+    def _move(self, entity, components):
+        archetype = self._archetype(frozenset(components))
+        archetype.add(entity, components)
+        self._entities[entity] = archetype
+
     def add_entity(self, *components):
         self._entity_id += 1
+        self._move(self._entity_id, {})
         for c in components:
             self.add_component(self._entity_id, c)
         return self._entity_id
 
     def remove_entity(self, entity):
-        comps = list(self._entities[entity].values())
-        [self.remove_component(entity, comp) for comp in comps]
-        self._entities.pop(entity)
+        self._entities.pop(entity).remove(entity)
 
     def add_component(self, entity, comp):
         comp_type = type(comp)
-        if entity not in self._entities:
-            self._entities[entity] = {}
-        self._entities[entity][comp_type] = comp
+        archetype = self._entities.get(entity)
+        if archetype is None:
+            components = {}
+        elif comp_type in archetype.columns:
+            archetype.columns[comp_type][archetype.rows[entity]] = comp
+            return
+        else:
+            components = archetype.remove(entity)
 
-        if comp_type not in self._components:
-            self._components[comp_type] = set()
-        self._components[comp_type].add(entity)
+        components[comp_type] = comp
+        self._move(entity, components)
 
     def remove_component(self, entity, component):
         if isinstance(component, type):
             comp_type = component
         else:
             comp_type = type(component)
-        self._entities[entity].pop(comp_type, None)
-        self._components.get(comp_type, set()).discard(entity)
+        archetype = self._entities[entity]
+        if comp_type not in archetype.columns:
+            return
+        components = archetype.remove(entity)
+        components.pop(comp_type)
+        self._move(entity, components)
 
     def remove_entities(self, entities):
         for entity in entities:
             self.remove_entity(entity)
 
+    def query(self, *types):
+        query = self._queries.get(types)
+        if query is None:
+            query = self._queries[types] = Query(types)
+            query.archetypes = [a for a in self._archetypes.values() if query.matches(a)]
+        return query
+
     def get_components(self, *types):
-        comps = self._components
-        ents = self._entities
-        for ent in self.get_entities(*types):
-            yield ent, self.get_entity(ent, *types)
+        return iter(self.query(*types))
+
+    def get_columns(self, *types):
+        return self.query(*types).batches()
 
     def get_entities(self, *types):
-        comps = self._components
-        ents = self._entities
-        try:
-            return set.intersection(*[comps[t] for t in types])
-        except KeyError:
-            return set()
+        return set(self.query(*types).entities())
 
     def get_entity(self, entity, *types):
-        ents = self._entities
-        return [ents[entity].get(t) for t in types]
+        archetype = self._entities[entity]
+        return [archetype.get(entity, t) for t in types]
 
     def process(self):
-        for system in self._systems:
-            system._process()
+        start = timer() if profiler.enabled else None
+        if self.scheduler is not None:
+            self.scheduler.run(self, self._systems)
+        else:
+            for system in self._systems:
+                system._process()
+        if start is not None:
+            profiler.record("registry.process", start)
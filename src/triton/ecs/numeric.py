@@ -0,0 +1,150 @@
+import numpy as np
+
+
+def numeric_component(cls):
+    """Class decorator for components that are plain numeric records
+
+    The fields are taken from the class annotations and their types are used
+    as NumPy dtypes; class attributes give the default values. Inside a
+    Registry, the fields of all entities in an archetype are packed in one
+    array per field, which systems can reach through Registry.get_columns.
+
+    Usage:
+        @numeric_component
+        class Position(Component):
+            x: float = 0.0
+            y: float = 0.0
+    """
+    dtypes = {name: np.dtype(t) for name, t in cls.__dict__.get("__annotations__", {}).items()}
+    defaults = {name: cls.__dict__.get(name, dtype.type(0)) for name, dtype in dtypes.items()}
+    for name in dtypes:
+        setattr(cls, name, _field(name))
+
+    cls._numeric_dtypes = dtypes
+    cls._numeric_defaults = defaults
+    cls._column = None
+    cls._row = None
+
+    if "__init__" not in cls.__dict__:
+
+        def __init__(self, *args, **kwargs):
+            values = dict(defaults)
+            values.update(zip(dtypes, args))
+            values.update(kwargs)
+            self._values = values
+
+        cls.__init__ = __init__
+
+    if "__repr__" not in cls.__dict__:
+
+        def __repr__(self):
+            fields = ", ".join("{}={}".format(n, getattr(self, n)) for n in dtypes)
+            return "{}({})".format(cls.__name__, fields)
+
+        cls.__repr__ = __repr__
+
+    return cls
+
+
+def is_numeric_component(comp_type):
+    return "_numeric_dtypes" in comp_type.__dict__
+
+
+def _detached_values(comp):
+    values = comp.__dict__.get("_values")
+    if values is None:
+        values = comp._values = dict(comp._numeric_defaults)
+    return values
+
+
+def _field(name):
+    def getter(self):
+        column = self._column
+        if column is None:
+            return _detached_values(self)[name]
+        return column.fields[name][self._row].item()
+
+    def setter(self, value):
+        column = self._column
+        if column is None:
+            _detached_values(self)[name] = value
+        else:
+            column.fields[name][self._row] = value
+
+    return property(getter, setter)
+
+
+class Fields(object):
+    """Array views of the fields of a numeric component in one archetype"""
+
+    def __init__(self, arrays):
+        self.__dict__.update(arrays)
+
+
+class NumericColumn(object):
+    """Packed storage for one numeric component type within an archetype
+
+    Behaves like the list columns of an Archetype, but keeps the field values
+    in NumPy arrays. Components stored in the column are bound to their row,
+    and their field properties read and write the arrays.
+    """
+
+    def __init__(self, comp_type, capacity=16):
+        self.comp_type = comp_type
+        self.objects = []
+        self.fields = {
+            name: np.zeros(capacity, dtype=dtype)
+            for name, dtype in comp_type._numeric_dtypes.items()
+        }
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __getitem__(self, row):
+        return self.objects[row]
+
+    def __setitem__(self, row, comp):
+        self._detach(self.objects[row])
+        self._store(row, comp)
+        self.objects[row] = comp
+
+    def append(self, comp):
+        row = len(self.objects)
+        capacity = len(next(iter(self.fields.values()), ()))
+        if row >= capacity:
+            for name, array in self.fields.items():
+                grown = np.zeros(max(16, 2 * capacity), dtype=array.dtype)
+                grown[:row] = array[:row]
+                self.fields[name] = grown
+        self.objects.append(comp)
+        self._store(row, comp)
+
+    def pop(self):
+        comp = self.objects[-1]
+        self._detach(comp)
+        self.objects.pop()
+        return comp
+
+    def _store(self, row, comp):
+        values = [(name, getattr(comp, name)) for name in self.fields]
+        if comp._column is not None:
+            comp._column._detach(comp)
+        for name, value in values:
+            self.fields[name][row] = value
+        comp._column = self
+        comp._row = row
+
+    def _detach(self, comp):
+        if comp._column is not self:
+            return
+        comp._values = {name: array[comp._row].item() for name, array in self.fields.items()}
+        comp._column = None
+        comp._row = None
+
+    def arrays(self):
+        """Returns Fields with a view of the used part of every field array"""
+        n = len(self.objects)
+        return Fields({name: array[:n] for name, array in self.fields.items()})
@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from timeit import default_timer as timer
+
+
+def conflicts(a, b):
+    """Tells whether two systems must not run at the same time
+
+    Systems that do not declare what they read and write conflict with
+    every other system.
+    """
+    if a.reads is None or a.writes is None or b.reads is None or b.writes is None:
+        return True
+    a_writes = set(a.writes)
+    b_writes = set(b.writes)
+    return bool(a_writes & b_writes or a_writes & set(b.reads) or b_writes & set(a.reads))
+
+
+def build_stages(systems):
+    """Groups systems into stages of mutually non-conflicting systems
+
+    A system is placed in the stage after the last earlier system it
+    conflicts with, so conflicting systems always run in the order they were
+    added, and each stage lists its systems in the order they were added.
+
+    Returns:
+        a list of stages, each a list of systems
+    """
+    stages = []
+    placed = []
+    for system in systems:
+        stage = 0
+        for other, other_stage in placed:
+            if other_stage >= stage and conflicts(system, other):
+                stage = other_stage + 1
+        placed.append((system, stage))
+        if stage == len(stages):
+            stages.append([])
+        stages[stage].append(system)
+    return stages
+
+
+class Scheduler(object):
+    """Runs the systems of a Registry in parallel stages
+
+    Systems declare the component types they read and write through their
+    reads and writes attributes. Systems that do not conflict are run on a
+    thread pool; events they emit are held back until the stage is done and
+    then sent in the order the systems were added, so results do not depend
+    on thread timing. Events between systems in the same stage therefore
+    arrive on the next tick. Systems in a parallel stage must not add or
+    remove entities and components.
+
+    Systems with a kernel, a static method wrapping a module level function,
+    are pure NumPy systems: after their events are processed,
+    kernel(*system.kernel_args()) is run on the process pool, and the result
+    handed to system.kernel_result().
+
+    The time spent in each system during the last tick is kept in timings.
+
+    Usage:
+        registry.scheduler = Scheduler(threads=4)
+        registry.process()
+        print(registry.scheduler.report())
+    """
+
+    def __init__(self, threads=4, processes=0):
+        self._threads = ThreadPoolExecutor(threads) if threads > 1 else None
+        self._processes = ProcessPoolExecutor(processes) if processes > 0 else None
+        self._systems = []
+        self.stages = []
+        self.timings = {}
+
+    def shutdown(self):
+        for executor in (self._threads, self._processes):
+            if executor is not None:
+                executor.shutdown()
+
+    def _run(self, system):
+        start = timer()
+        system._process()
+        if system.kernel is not None:
+            args = system.kernel_args()
+            if self._processes is not None:
+                result = self._processes.submit(system.kernel, *args).result()
+            else:
+                result = system.kernel(*args)
+            system.kernel_result(result)
+        return timer() - start
+
+    def run(self, registry, systems):
+        if systems != self._systems:
+            self._systems = list(systems)
+            self.stages = build_stages(self._systems)
+
+        timings = {}
+        for stage in self.stages:
+            if len(stage) == 1 or self._threads is None:
+                for system in stage:
+                    timings[system] = self._run(system)
+                continue
+
+            for system in stage:
+                system._outbox = []
+            try:
+                for system, elapsed in zip(stage, self._threads.map(self._run, stage)):
+                    timings[system] = elapsed
+            finally:
+                for system in stage:
+                    outbox = system._outbox
+                    system._outbox = None
+                    for einstance in outbox:
+                        registry._propagate_event(einstance)
+        self.timings = timings
+
+    def report(self):
+        """Returns the stages with the time each system took in the last tick"""
+        return [
+            [(system.__class__.__name__, self.timings.get(system, 0.0)) for system in stage]
+            for stage in self.stages
+        ]
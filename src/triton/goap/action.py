@@ -1,3 +1,8 @@
+import heapq
+from collections import OrderedDict
+from itertools import count
+
+
 class Action:
     preconditions = {}
     effects = {}
@@ -45,10 +50,27 @@ class Goal:
 
 
 class Agent:
+    """An agent pursuing goals through actions
+
+    The agent keeps the full plan it is following. next_action() only plans
+    when the goals change or the plan is used up; otherwise it checks the
+    current state against the conditions the rest of the plan needs, which
+    are computed once per plan. When an action had other effects than
+    planned, the plan is repaired: it skips ahead when a later part of the
+    plan can already be carried out, or searches for a bridge from the
+    current state back to the plan. Only when that fails is a new plan made.
+
+    plan_stats counts the plans made and repaired.
+    """
+
     def __init__(self):
         self.goals = []
         self.actions = []
         self.state = {}
+        self.plan = []
+        self.plan_stats = {"plans": 0, "repairs": 0}
+        self._needs = []
+        self._planned_goals = None
         self.init()
 
     def get_actions(self):
@@ -59,6 +81,49 @@ class Agent:
             return
         if action._perform(self) != False:
             self.state.update(action.effects)
+        if self.plan and action is self.plan[0]:
+            self.plan.pop(0)
+            self._needs.pop(0)
+
+    def next_action(self):
+        """Returns the next action of the current plan, planning or repairing it when needed
+
+        Returns:
+            an action, or False when every goal is reached or no goal has a plan
+        """
+        actions = action_set(self.actions)
+        if self._planned_goals != self.goals or not self.plan:
+            return self._replan(actions)
+
+        state = actions.encode(self.state)
+        needs = self._needs
+        if state & needs[0] == needs[0]:
+            return self.plan[0]
+
+        self.plan_stats["repairs"] += 1
+        for k in range(len(self.plan) - 1, 0, -1):
+            if state & needs[k] == needs[k]:
+                del self.plan[:k]
+                del needs[:k]
+                return self.plan[0]
+        bridge = actions.search(state, needs[0])
+        if bridge is None:
+            return self._replan(actions)
+        self.plan[:0] = bridge[1]
+        self._needs = actions.regress(needs[0], bridge[1]) + needs
+        return self.plan[0]
+
+    def _replan(self, actions):
+        self.plan_stats["plans"] += 1
+        self._planned_goals = list(self.goals)
+        best = cheapest_plan(actions, self.state, self.goals)
+        if best is None:
+            self.plan, self._needs = [], []
+            return False
+        goal, (cost, plan) = best
+        self.plan = list(plan)
+        self._needs = actions.regress(goal, plan) + [goal]
+        return self.plan[0]
 
     def set_goal(self, goal):
         self.goals.insert(0, goal)
@@ -77,58 +142,235 @@ def debug(msg):
     print(msg)
 
 
-def goal_planner(agent):
+class ActionSet:
+    """Actions compiled to bitmasks over the (key, value) conditions they use
+
+    Every (key, value) pair found in the preconditions and effects of the
+    actions, or in a goal, gets a bit. A state is encoded as the bits of the
+    pairs it holds, so checking conditions is a mask test and applying an
+    action clears the bits of the keys it sets before setting its own. Keys
+    no action or goal mentions are left out of the encoding.
+
+    Plans are searched for with A*, using the number of unsatisfied goal
+    conditions, divided by the most conditions one action can satisfy and
+    times the cheapest action, as an admissible heuristic. Found plans are
+    kept in an LRU cache keyed on the encoded state and goal.
+
+    Usage:
+        actions = ActionSet([MineOre, SellOre])
+        cost, plan = actions.plan(agent.state, {"hasOre": True})
+    """
+
+    def __init__(self, actions, maxsize=4096):
+        self.actions = [action() for action in actions]
+        self._rows = {action: i for i, action in enumerate(self.actions)}
+        self.maxsize = maxsize
+        self.plans = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._bits = {}
+        self._keys = {}
+        self.table = None
+        for action in self.actions:
+            for conditions in (action.preconditions, action.effects):
+                for key, value in conditions.items():
+                    self._bit(key, value)
+        self._compile()
+
+    def _bit(self, key, value):
+        bit = self._bits.get((key, value))
+        if bit is None:
+            bit = self._bits[(key, value)] = 1 << len(self._bits)
+            self._keys[key] = self._keys.get(key, 0) | bit
+            if self.table is not None:
+                # effects on key must now clear the new bit as well
+                self._compile()
+                self.plans.clear()
+        return bit
+
+    def _compile(self):
+        rows = []
+        for action in self.actions:
+            clear = effect = 0
+            for key, value in action.effects.items():
+                clear |= self._keys[key]
+                effect |= self._bits[(key, value)]
+            rows.append((self.mask(action.preconditions), clear, effect, action.cost))
+        min_cost = max(0.0, min((a.cost for a in self.actions), default=0.0))
+        max_effects = max([len(a.effects) for a in self.actions] + [1])
+        self.table = (tuple(rows), min_cost, max_effects)
+
+    def mask(self, conditions):
+        """Returns the bits of a set of conditions, adding bits for unseen pairs"""
+        bits = 0
+        for key, value in conditions.items():
+            bits |= self._bit(key, value)
+        return bits
+
+    def regress(self, goal, plan):
+        """Returns, per action of plan, the bits that must hold before it for plan to reach goal"""
+        rows = self.table[0]
+        needs = []
+        for action in reversed(plan):
+            precondition, clear, effect, cost = rows[self._rows[action]]
+            goal = (goal & ~clear) | precondition
+            needs.append(goal)
+        needs.reverse()
+        return needs
+
+    def key_mask(self, conditions):
+        """Returns the bits of every value of the keys of a set of conditions"""
+        bits = 0
+        for key in conditions:
+            bits |= self._keys.get(key, 0)
+        return bits
+
+    def encode(self, state):
+        """Returns the bits of the (key, value) pairs of state"""
+        bits = 0
+        for key, value in state.items():
+            if key in self._keys:
+                try:
+                    bits |= self._bits.get((key, value), 0)
+                except TypeError:
+                    pass
+        return bits
+
+    def plan(self, state, goal):
+        """Finds the cheapest sequence of actions taking state to one satisfying goal
+
+        Args:
+            state: a dict of the agent state
+            goal: a dict of goal conditions
+
+        Returns:
+            (cost, [actions, first to last]), or None when no plan exists
+        """
+        goal = self.mask(goal)  # before encoding state, as it may add bits
+        return self.search(self.encode(state), goal)
+
+    def search(self, state, goal):
+        """Like plan, on an encoded state and goal mask"""
+        key = (state, goal)
+        if key in self.plans:
+            return self.cached(key)
+        self.misses += 1
+        return self.store(key, astar(self.table, state, goal))
+
+    def cached(self, key):
+        """Returns the cached plan for key, a (state, goal) pair, and marks it as recently used"""
+        self.plans.move_to_end(key)
+        self.hits += 1
+        return self.plans[key]
+
+    def store(self, key, result):
+        """Caches the result of astar for key and returns it as a plan"""
+        plan = None
+        if result is not None:
+            plan = (result[0], [self.actions[i] for i in result[1]])
+        self.plans[key] = plan
+        if len(self.plans) > self.maxsize:
+            self.plans.popitem(last=False)
+        return plan
+
+
+def astar(table, start, goal):
+    """Searches for the cheapest path from start to a state holding all bits of goal
+
+    Args:
+        table: the table of an ActionSet, (rows, min_cost, max_effects),
+            with a (precondition, clear, effect, cost) row per action
+        start: the bits of the start state
+        goal: the bits of the goal conditions
+
+    Returns:
+        (cost, [action indices, first to last]), or None when there is no plan
+    """
+    rows, min_cost, max_effects = table
+    costs = {start: 0.0}
+    parents = {}
+    tie = count()
+    frontier = [(-(-(goal & ~start).bit_count() // max_effects) * min_cost, next(tie), 0.0, start)]
+    while frontier:
+        _, _, cost, state = heapq.heappop(frontier)
+        if cost > costs[state]:
+            continue
+        if state & goal == goal:
+            path = []
+            while state != start:
+                state, i = parents[state]
+                path.append(i)
+            path.reverse()
+            return cost, path
+
+        for i, (precondition, clear, effect, action_cost) in enumerate(rows):
+            if state & precondition != precondition:
+                continue
+            new_state = (state & ~clear) | effect
+            new_cost = cost + action_cost
+            if new_state != state and new_cost < costs.get(new_state, float("inf")):
+                costs[new_state] = new_cost
+                parents[new_state] = (state, i)
+                missing = (goal & ~new_state).bit_count()
+                f = new_cost - (-missing // max_effects) * min_cost
+                heapq.heappush(frontier, (f, next(tie), new_cost, new_state))
+    return None
 
-    def validate_actions(state, actions, goal_conditions, cost=0):
 
-        if set(goal_conditions.items()) <= set(state.items()):
-            return [cost]
+_action_sets = {}
 
-        valid_actions = []
 
-        for action in actions:
-            if set(action.preconditions.items()) <= set(state.items()):
-                new_state = state.copy()
-                new_state.update(action.effects)
+def action_set(actions):
+    """Returns the ActionSet of a list of action classes, compiled once per list"""
+    key = tuple(actions)
+    compiled = _action_sets.get(key)
+    if compiled is None:
+        compiled = _action_sets[key] = ActionSet(key)
+    return compiled
 
-                total_cost = validate_actions(
-                    new_state, actions - set([action]), goal_conditions, cost + action.cost
-                )
 
-                if total_cost is not None:
-                    total_cost.append(action)
-                    valid_actions.append(total_cost)
+def cheapest_plan(actions, state, goals):
+    """Plans for every goal not reached yet and picks the cheapest plan
 
-        if len(valid_actions) == 0:
-            return None
+    Args:
+        actions: an ActionSet
+        state: a dict of the agent state
+        goals: a list of Goal
 
-        valid_actions.sort(key=lambda plan: plan[0])
-        return valid_actions[0]
+    Returns:
+        (goal bits, (cost, [actions])), or None when no such goal has a plan
+    """
+    goals = [actions.mask(goal.get_conditions()) for goal in goals]
+    state = actions.encode(state)
 
     plans = []
-    for goal in agent.goals:
-        goal_conditions = dict(goal.get_conditions())
-        actions = set(action() for action in agent.actions)
-        state = agent.state.copy()
-        v = validate_actions(state, actions, goal_conditions)
-
-        try:
-            if v is None:
-                debug("No valid plan")
-                continue
-            if v == [0]:
-                debug("Goal reached")
-                continue
-            plans.append(v)
-        except:
-            pass
+    for goal in goals:
+        plan = actions.search(state, goal)
+        if plan is None:
+            debug("No valid plan")
+            continue
+        if not plan[1]:
+            debug("Goal reached")
+            continue
+        plans.append((goal, plan))
 
     # Pick the plan that leads to goal fulfillment at least cost.
-    plans.sort()
-    try:
-        return plans[0][-1]
-    except:
+    if not plans:
+        return None
+    return min(plans, key=lambda plan: plan[1][0])
+
+
+def goal_planner(agent):
+    """Plans for every goal of agent and picks the cheapest plan
+
+    Returns:
+        the first action of the cheapest plan, or False when every goal is
+        reached or no goal has a plan
+    """
+    best = cheapest_plan(action_set(agent.actions), agent.state, agent.goals)
+    if best is None:
         return False
+    return best[1][1][0]
 
 
 if __name__ == "__main__":
@@ -207,7 +449,7 @@ if __name__ == "__main__":
         if gimli.verify_goals():
             print("Reached goal")
             break
-        action = goal_planner(gimli)
+        action = gimli.next_action()
         if not action:
             break
         gimli.do_action(action)
@@ -0,0 +1,248 @@
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count, repeat
+from timeit import default_timer as timer
+
+from triton.goap.action import ActionSet, astar
+from triton.timer import Stopwatch
+
+
+def _search_all(table, keys):
+    return [astar(table, state, goal) for state, goal in keys]
+
+
+class Planner(object):
+    """Plans for batches of agents sharing one catalogue of actions
+
+    The actions are compiled once into an ActionSet. A batch of states and
+    goals is encoded, identical (state, goal) pairs are planned for once, and
+    pairs found in the plan cache are not searched at all. With processes,
+    batches with more than chunksize searches are split over a process pool;
+    the workers only get the integer table of the action set, and their
+    results are added to the cache.
+
+    After every batch, stats holds the counts and times of the batch, and
+    timings the times of the last batches.
+
+    Usage:
+        planner = Planner([MineOre, SellOre, Drink], processes=4)
+        plans = planner.plan_agents(dwarves)
+        print(planner.stats, planner.timings.summary())
+        planner.shutdown()
+    """
+
+    def __init__(self, actions, processes=0, maxsize=4096, chunksize=64):
+        self.actions = ActionSet(actions, maxsize)
+        self.chunksize = chunksize
+        self._processes = ProcessPoolExecutor(processes) if processes > 0 else None
+        self.stats = {}
+        self.timings = Stopwatch("goap.plan", maxlen=1000)
+
+    def shutdown(self):
+        if self._processes is not None:
+            self._processes.shutdown()
+
+    def _search(self, keys):
+        table = self.actions.table
+        if self._processes is None or len(keys) <= self.chunksize:
+            return _search_all(table, keys)
+        chunks = [keys[i : i + self.chunksize] for i in range(0, len(keys), self.chunksize)]
+        results = []
+        for chunk in self._processes.map(_search_all, repeat(table), chunks):
+            results += chunk
+        return results
+
+    def plan(self, states, goals):
+        """Plans for a batch of states and goals
+
+        Args:
+            states: a list of agent state dicts
+            goals: a list of goal condition dicts, one per state
+
+        Returns:
+            a list with, per state, (cost, [actions, first to last]), or None
+            when no plan exists
+        """
+        start = timer()
+        actions = self.actions
+        masks = [actions.mask(goal) for goal in goals]
+        keys = [(actions.encode(state), mask) for state, mask in zip(states, masks)]
+
+        plans = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            if key in actions.plans:
+                plans[key] = actions.cached(key)
+            else:
+                missing.append(key)
+
+        searched = timer()
+        actions.misses += len(missing)
+        for key, result in zip(missing, self._search(missing)):
+            plans[key] = actions.store(key, result)
+
+        end = timer()
+        self.timings.add(end - start)
+        self.stats = {
+            "requests": len(keys),
+            "unique": len(plans),
+            "cached": len(plans) - len(missing),
+            "searched": len(missing),
+            "search_time": end - searched,
+            "time": end - start,
+        }
+        return [plans[key] for key in keys]
+
+    def plan_agents(self, agents):
+        """Plans for every goal of every agent in one batch
+
+        Returns:
+            a list with, per agent, the cheapest plan reaching one of its goals
+            that are not reached yet, or None when there is no such plan
+        """
+        states, goals, owners = [], [], []
+        for i, agent in enumerate(agents):
+            for goal in agent.goals:
+                states.append(agent.state)
+                goals.append(goal.get_conditions())
+                owners.append(i)
+
+        best = [None] * len(agents)
+        for i, plan in zip(owners, self.plan(states, goals)):
+            if plan is None or not plan[1]:
+                continue
+            if best[i] is None or plan[0] < best[i][0]:
+                best[i] = plan
+        return best
+
+
+class RegressivePlanner(object):
+    """Plans backwards from the goal conditions through the actions producing them
+
+    The search starts from the goal conditions. An action is relevant when
+    one of its effects produces a condition and none of them undoes another
+    one; regressing through it replaces the conditions it produces with its
+    preconditions. Relevant actions are found through an index from every
+    effect bit to the actions producing it, so actions unrelated to the goal
+    are never looked at. The search is done when the start state holds all
+    remaining conditions.
+
+    Nodes are expanded in order of cost plus weight times the admissible
+    heuristic of ActionSet, so with a weight above 1 a plan is found early,
+    and then improved on until the search space is exhausted or a budget of
+    iterations or seconds runs out. The best plan found so far is returned;
+    stats tells whether it is known to be optimal.
+
+    Usage:
+        planner = RegressivePlanner(rig_actions, max_time=0.002)
+        plan = planner.plan(agent.state, goal.get_conditions())
+    """
+
+    def __init__(self, actions, max_iterations=None, max_time=None, weight=2.0, maxsize=4096):
+        if not isinstance(actions, ActionSet):
+            actions = ActionSet(actions, maxsize)
+        self.actions = actions
+        self.max_iterations = max_iterations
+        self.max_time = max_time
+        self.weight = weight
+        self.stats = {}
+        self._table = None
+
+    def _compile(self):
+        """Indexes the actions by effect bit, again whenever the action set has added bits"""
+        table = self.actions.table
+        if table is self._table:
+            return
+        self._table = table
+        self._index = {}
+        self._pre_keys = []
+        for i, (precondition, clear, effect, cost) in enumerate(table[0]):
+            bits = effect
+            while bits:
+                bit = bits & -bits
+                self._index.setdefault(bit, []).append(i)
+                bits ^= bit
+            self._pre_keys.append(self.actions.key_mask(self.actions.actions[i].preconditions))
+
+    def plan(self, state, goal):
+        """Finds a plan taking state to one satisfying goal, within the budget
+
+        Args:
+            state: a dict of the agent state
+            goal: a dict of goal conditions
+
+        Returns:
+            (cost, [actions, first to last]), or None when no plan was found
+        """
+        goal = self.actions.mask(goal)
+        start = self.actions.encode(state)
+        self._compile()
+        began = timer()
+        result, iterations, optimal = self._search(start, goal, began)
+        self.stats = {"iterations": iterations, "optimal": optimal, "time": timer() - began}
+        if result is None:
+            return None
+        return result[0], [self.actions.actions[i] for i in result[1]]
+
+    def _search(self, start, goal, began):
+        rows, min_cost, max_effects = self._table
+        index, pre_keys, weight = self._index, self._pre_keys, self.weight
+
+        def heuristic(node):
+            return -(-(node & ~start).bit_count() // max_effects) * min_cost
+
+        costs = {goal: 0.0}
+        parents = {}
+        tie = count()
+        frontier = [(weight * heuristic(goal), next(tie), 0.0, goal)]
+        best = None
+        iterations = 0
+        while frontier:
+            _, _, cost, node = heapq.heappop(frontier)
+            if cost > costs[node]:
+                continue
+            if best is not None and cost + heuristic(node) >= best[0]:
+                continue
+            if start & node == node:
+                best = (cost, node)
+                continue
+
+            iterations += 1
+            if self.max_iterations is not None and iterations > self.max_iterations:
+                break
+            if self.max_time is not None and timer() - began > self.max_time:
+                break
+
+            relevant = set()
+            bits = node
+            while bits:
+                bit = bits & -bits
+                relevant.update(index.get(bit, ()))
+                bits ^= bit
+            for i in sorted(relevant):
+                precondition, clear, effect, action_cost = rows[i]
+                if node & clear & ~effect:
+                    continue
+                rest = node & ~clear
+                if rest & pre_keys[i] & ~precondition:
+                    continue
+                new_node = rest | precondition
+                new_cost = cost + action_cost
+                if new_node != node and new_cost < costs.get(new_node, float("inf")):
+                    costs[new_node] = new_cost
+                    parents[new_node] = (node, i)
+                    f = new_cost + weight * heuristic(new_node)
+                    heapq.heappush(frontier, (f, next(tie), new_cost, new_node))
+        else:
+            return self._path(best, goal, parents), iterations, True
+        return self._path(best, goal, parents), iterations, False
+
+    def _path(self, best, goal, parents):
+        if best is None:
+            return None
+        cost, node = best
+        path = []
+        while node != goal:
+            node, i = parents[node]
+            path.append(i)
+        return cost, path
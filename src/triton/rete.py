@@ -19,31 +19,34 @@
 # THE SOFTWARE.
 
 
-class Node:
-    __symbol_counter = {}
+from contextlib import contextmanager
 
-    def gensym(self, prefix):
-        Node.__symbol_counter.setdefault(prefix, 0)
-        Node.__symbol_counter[prefix] += 1
-        return prefix + "_" + str(Node.__symbol_counter[prefix])
+from triton.timer import profiler, timer
 
+
+class Node:
     def __init__(self, type=None, parent=None, net=None):
-        self.name = self.gensym(type)
+        self.type = type
+        self.name = net.gensym(type)
         self.net = net
+        net._nodes.append(self)
         self.parent = parent
+        self.activations = 0
+        self.time = 0.0
         if self.parent is not None:
             self.parent.add_child(self)
-        self.children = set()
+        self.children = []
 
     def __json__(self):
         return {"name": self.name, "parent": self.parent}
 
     def add_child(self, node):
         if node not in self.children:
-            self.children.add(node)
+            self.children.append(node)
         return node
 
 
+import heapq
 import operator
 
 
@@ -78,21 +81,18 @@ class AlphaNode(Node):
         if self.test is not None:
             if not wme.attr == self.test.attr:
                 return
-            wme = Fact(wme.id, wme.attr, wme.value)
-            if isinstance(self.test.target, Var) and not isinstance(wme.value, Var):
-                wme.value = Var(self.test.target.identity, bound=wme.value)
-            elif not self.TEST_OPERATOR[self.test.operand](wme.value, self.test.target):
+            if not isinstance(self.test.target, Var) and not self.TEST_OPERATOR[self.test.operand](
+                wme.value, self.test.target
+            ):
                 return
-
-            if not isinstance(wme.id, Var):
-                wme.id = Var(self.test.id, bound=wme.id)
+        self.activations += 1
 
         for child in self.children:
             child.add_wme(wme)
 
     def add_test(self, test):
         for child in self.children:
-            if child.test == test:
+            if _same_test(child.test, test):
                 return child
         return self.add_child(AlphaNode(net=self.net, parent=self, test=test))
 
@@ -103,72 +103,412 @@ class AlphaNode(Node):
         return self.add_child(AlphaMemoryNode(net=self.net, parent=self))
 
 
+def _same_test(a, b):
+    """Tells whether two conditions test WMEs the same way
+
+    The variable names are not part of the test: WMEs are stored as they are
+    and only bound to the variables of a production when it fires.
+    """
+    if a.attr != b.attr:
+        return False
+    if isinstance(a.target, Var) or isinstance(b.target, Var):
+        return isinstance(a.target, Var) and isinstance(b.target, Var)
+    return a.operand == b.operand and a.target == b.target
+
+
+def _test_key(test):
+    if isinstance(test.target, Var):
+        return (test.attr, Var)
+    return (test.attr, test.operand, test.target)
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class AlphaRootNode(AlphaNode):
+    """Root of the alpha network
+
+    Test nodes are indexed on attribute and, for equality tests against a
+    constant, on (attribute, constant), so adding a WME only visits the test
+    nodes that can match it. Conditions only differing in their variable
+    names share a test node.
+    """
+
+    EQUALITY_OPERANDS = ("=", "==")
+
+    def __init__(self, **kwargs):
+        super().__init__(test=None, **kwargs)
+        self._tests = {}
+        self._by_attr = {}
+        self._by_value = {}
+        self._eq_by_attr = {}
+
+    def add_wme(self, wme):
+        for child in self._by_attr.get(wme.attr, ()):
+            child.add_wme(wme)
+
+        if isinstance(wme.value, Var) or not _hashable(wme.value):
+            nodes = self._eq_by_attr.get(wme.attr, ())
+        else:
+            nodes = self._by_value.get((wme.attr, wme.value), ())
+        for child in nodes:
+            child.add_wme(wme)
+
+    def add_test(self, test):
+        key = _test_key(test)
+        if _hashable(key):
+            node = self._tests.get(key)
+        else:
+            key = None
+            node = next((c for c in self.children if _same_test(c.test, test)), None)
+        if node is not None:
+            return node
+
+        node = self.add_child(AlphaNode(net=self.net, parent=self, test=test))
+        if key is not None:
+            self._tests[key] = node
+
+        if (
+            test.operand in self.EQUALITY_OPERANDS
+            and not isinstance(test.target, Var)
+            and _hashable(test.target)
+        ):
+            self._by_value.setdefault((test.attr, test.target), []).append(node)
+            self._eq_by_attr.setdefault(test.attr, []).append(node)
+        else:
+            self._by_attr.setdefault(test.attr, []).append(node)
+        return node
+
+
+def _bound(value):
+    return value.bound if isinstance(value, Var) else value
+
+
+def join_tests(conds, cond):
+    """Precomputes the tests joining a condition to the conditions before it
+
+    A token matches a WME when, for any earlier condition, the variable it
+    binds is the one bound by the new condition. Which fields of the WMEs are
+    compared only depends on the conditions, so it is decided once, when the
+    production is added.
+
+    Args:
+        conds: the conditions matched by the tokens, in order
+        cond: the condition matched by the WMEs
+
+    Negated, existential and aggregate conditions bind no variables, and are
+    skipped among the earlier conditions.
+
+    Returns:
+        a tuple of (position, token field, wme field), where position is the
+        index of a WME in the token, and the fields are "id" or "value"
+    """
+    tests = []
+    for position, other in enumerate(conds):
+        if not isinstance(other, Cond):
+            continue
+        if isinstance(other.target, Var):
+            if other.target.identity == cond.id:
+                tests.append((position, "value", "id"))
+        elif isinstance(cond.target, Var):
+            if other.id == cond.target.identity:
+                tests.append((position, "id", "value"))
+        elif other.id == cond.id:
+            tests.append((position, "id", "id"))
+    return tuple(tests)
+
+
+class JoinIndex:
+    """Hash index from the bound value of a WME field to the items holding it
+
+    Items are stored under a key, so that they can be replaced and removed.
+    Items with a value that cannot be hashed are kept aside and scanned.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.unhashable = {}
+
+    def __len__(self):
+        return sum(len(b) for b in self.buckets.values()) + len(self.unhashable)
+
+    def add(self, bound, key, item):
+        try:
+            self.buckets.setdefault(bound, {})[key] = item
+        except TypeError:
+            self.unhashable[key] = (bound, item)
+
+    def remove(self, bound, key):
+        try:
+            bucket = self.buckets.get(bound)
+        except TypeError:
+            self.unhashable.pop(key, None)
+            return
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self.buckets[bound]
+
+    def get(self, bound):
+        try:
+            bucket = self.buckets.get(bound)
+        except TypeError:
+            bucket = None
+        items = list(bucket.values()) if bucket is not None else []
+        if self.unhashable:
+            items += [item for b, item in self.unhashable.values() if b == bound]
+        return items
+
+
+class Token:
+    """A partial match: a WME appended to the token of the level above
+
+    Tokens are linked through their parents rather than copied, so a token
+    for k conditions shares its first k - 1 WMEs with the token it was
+    extended from. Indexing walks up the chain; list() materializes it.
+
+    Each token also knows the node storing it and the tokens extended from
+    it, so retracting a WME deletes exactly the tokens derived from it.
+    """
+
+    __slots__ = ("parent", "wme", "length", "node", "children")
+
+    def __init__(self, parent, wme, node=None):
+        self.parent = parent
+        self.wme = wme
+        self.node = node
+        self.children = None
+        if parent is None:
+            self.length = 1
+        else:
+            self.length = parent.length + 1
+            if parent.children is None:
+                parent.children = set()
+            parent.children.add(self)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self.length
+        if not 0 <= position < self.length:
+            raise IndexError("token index out of range")
+        token = self
+        for _ in range(self.length - 1 - position):
+            token = token.parent
+        return token.wme
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __json__(self):
+        return self.to_list()
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.to_list())
+
+    def to_list(self):
+        wmes = [None] * self.length
+        token = self
+        for position in range(self.length - 1, -1, -1):
+            wmes[position] = token.wme
+            token = token.parent
+        return wmes
+
+    def delete(self):
+        """Removes the token and every token derived from it from the network"""
+        stack = [self]
+        while stack:
+            token = stack.pop()
+            if token.children:
+                stack.extend(token.children)
+                token.children = None
+            token.node.remove_token(token)
+        if self.parent is not None and self.parent.children:
+            self.parent.children.discard(self)
+
+
 class AlphaMemoryNode(Node):
+    """Holds the WMEs passing an alpha test, keyed by fact id
+
+    For every WME, the tokens ending in it are kept, so that they can be
+    deleted when the WME is retracted.
+    """
+
     def __init__(self, **kwargs):
         super().__init__(type="alpha-memory-node", **kwargs)
         self.wmes = {}
+        self.indexes = {}
+        self.derived = {}
 
     def __json__(self):
         doc = super().__json__()
         doc.update({"wmes": {str(k): v for k, v in self.wmes.items()}})
         return doc
 
+    def add_child(self, node):
+        """Adds a join node, keeping the joins ordered deepest first
+
+        A WME joining with itself at two levels of a production must right
+        activate the deeper join first: the token the upper join then creates
+        finds the WME already stored, and is joined with it only once.
+        """
+        if node not in self.children:
+            depths = [child.depth for child in self.children]
+            position = next((i for i, d in enumerate(depths) if d < node.depth), len(depths))
+            self.children.insert(position, node)
+        return node
+
+    def add_index(self, field):
+        """Returns the index of the WMEs on the bound value of field, "id" or "value" """
+        index = self.indexes.get(field)
+        if index is None:
+            index = self.indexes[field] = JoinIndex()
+            for key, wme in self.wmes.items():
+                index.add(_bound(getattr(wme, field)), key, wme)
+        return index
+
+    def link(self, token):
+        """Records that token ends in one of the WMEs in this memory"""
+        self.derived.setdefault(_bound(token.wme.id), set()).add(token)
+
+    def unlink(self, token):
+        tokens = self.derived.get(_bound(token.wme.id))
+        if tokens is not None:
+            tokens.discard(token)
+
     def retract_wme(self, wme):
-        if wme.id in self.wmes:
-            self.wmes.pop(wme.id)
+        key = _bound(wme.id)
+        old = self.wmes.pop(key, None)
+        if old is None:
+            return
+        for field, index in self.indexes.items():
+            index.remove(_bound(getattr(old, field)), key)
+        for token in self.derived.pop(key, ()):
+            token.delete()
+        for child in self.children:
+            if isinstance(child, CountingNode):
+                child.right_retraction(old)
+
+    def store(self, wme):
+        """Stores a WME without activating the join nodes below"""
+        key = _bound(wme.id)
+        if key in self.wmes:
+            self.retract_wme(wme)
+        self.wmes[key] = wme
+        for field, index in self.indexes.items():
+            index.add(_bound(getattr(wme, field)), key, wme)
+        self.net._add_retraction(wme, self)
 
     def add_wme(self, wme):
-        self.wmes[wme.id] = wme
-        self.net._add_retraction(wme, self)
+        self.store(wme)
+        self.activations += 1
+        # Counting nodes go first: a token created by the joins below already
+        # counts this WME when it reaches them.
         for child in self.children:
-            assert isinstance(child, BetaNode)
-            child.right_activation(wme)
+            if isinstance(child, CountingNode):
+                child.right_activation(wme)
+        for child in self.children:
+            if not isinstance(child, CountingNode):
+                child.right_activation(wme)
 
 
 class BetaNode(Node):
-    def __init__(self, alpha_memory=None, test=None, **kwargs):
-        super().__init__(type="beta-node", **kwargs)
+    """Joins the tokens of the parent beta memory with the WMEs of an alpha memory
+
+    The join tests are given by join_tests(). Both memories keep a hash index
+    for every test, so an activation only visits the tokens or WMEs that
+    match it.
+    """
+
+    options = {}
+
+    def __init__(self, alpha_memory=None, test=None, tests=(), type="beta-node", **kwargs):
+        super().__init__(type=type, **kwargs)
         assert alpha_memory is not None
 
         self.test = test
+        self.tests = tests
+        self.depth = 0 if self.parent is None else self.parent.parent.depth + 1
         self.alpha_memory = alpha_memory
         alpha_memory.add_child(self)
 
-    def join_test(self, token, wme):
-        for twme in token:
-            if isinstance(twme.value, Var):
-                if twme.value == wme.id:
-                    return True
-            elif isinstance(wme.value, Var):
-                if twme.id == wme.value:
-                    return True
-            elif twme.id == wme.id:
-                return True
-        return False
+        self._wme_indexes = [
+            (position, token_field, alpha_memory.add_index(wme_field))
+            for position, token_field, wme_field in tests
+        ]
+        if self.parent is not None:
+            self._token_indexes = [
+                (wme_field, self.parent.add_index(position, token_field))
+                for position, token_field, wme_field in tests
+            ]
 
     def __json__(self):
         doc = super().__json__()
         doc.update({"alpha_memory": self.alpha_memory if self.alpha_memory is not None else None})
         return doc
 
+    @staticmethod
+    def _matches(lookups):
+        """Returns the items found in any of the (index, bound) lookups, once each"""
+        if len(lookups) == 1:
+            index, bound = lookups[0]
+            return index.get(bound)
+        found = {}
+        for index, bound in lookups:
+            for item in index.get(bound):
+                found[id(item)] = item
+        return list(found.values())
+
+    def link(self, token):
+        """Records that a token below ends in a WME of the alpha memory"""
+        self.alpha_memory.link(token)
+
+    def unlink(self, token):
+        self.alpha_memory.unlink(token)
+
+    def forget(self, token):
+        """Called when a token of the parent memory is removed"""
+
     def right_activation(self, wme):
+        self.activations += 1
         if self.parent is None:
             for child in self.children:
-                child.left_activation([], wme)
+                child.left_activation(None, wme)
         else:
-            for token in self.parent.tokens.values():
-                if self.join_test(token, wme):
-                    for child in self.children:
-                        assert isinstance(child, (BetaMemoryNode, ProductionNode))
-                        child.left_activation(token, wme)
-
-    def left_activation(self, token):
-        for wme in list(self.alpha_memory.wmes.values()):
-            if self.join_test(token, wme):
+            start = timer() if profiler.enabled else None
+            lookups = [
+                (index, _bound(getattr(wme, wme_field))) for wme_field, index in self._token_indexes
+            ]
+            tokens = self._matches(lookups)
+            if start is not None:
+                self.time += timer() - start
+            for token in tokens:
                 for child in self.children:
                     assert isinstance(child, (BetaMemoryNode, ProductionNode))
                     child.left_activation(token, wme)
 
+    def left_activation(self, token):
+        self.activations += 1
+        start = timer() if profiler.enabled else None
+        lookups = [
+            (index, _bound(getattr(token[position], token_field)))
+            for position, token_field, index in self._wme_indexes
+        ]
+        wmes = self._matches(lookups)
+        if start is not None:
+            self.time += timer() - start
+        for wme in wmes:
+            for child in self.children:
+                assert isinstance(child, (BetaMemoryNode, ProductionNode))
+                child.left_activation(token, wme)
+
     def add_memory(self):
         for child in self.children:
             if isinstance(child, BetaMemoryNode):
@@ -176,59 +516,395 @@ class BetaNode(Node):
         return self.add_child(BetaMemoryNode(net=self.net, parent=self))
 
 
+class CountingNode(BetaNode):
+    """Base of the join nodes keeping state per token of the parent memory
+
+    The WMEs joining a token are the ones passing the join tests, or, when the
+    condition shares no variable with the earlier ones, every WME in the alpha
+    memory. The state is updated as WMEs are added and retracted, so a change
+    costs O(matches). Tokens passed on to the children end in None, or in the
+    WME given by output().
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        assert self.parent is not None, "the first condition of a production must be positive"
+        self.state = {}
+
+    def link(self, token):
+        pass
+
+    def unlink(self, token):
+        pass
+
+    def forget(self, token):
+        self.state.pop(token, None)
+
+    def _tokens_for(self, wme):
+        if not self.tests:
+            return list(self.parent.tokens)
+        return self._matches(
+            [(index, _bound(getattr(wme, wme_field))) for wme_field, index in self._token_indexes]
+        )
+
+    def _wmes_for(self, token):
+        if not self.tests:
+            return list(self.alpha_memory.wmes.values())
+        return self._matches(
+            [
+                (index, _bound(getattr(token[position], token_field)))
+                for position, token_field, index in self._wme_indexes
+            ]
+        )
+
+    def _outputs(self, token):
+        return [t for t in token.children or () if t.node.parent is self]
+
+    def same(self, before, after):
+        return before == after
+
+    def _update(self, token, before):
+        """Replaces the tokens passed on for token if its output changed from before"""
+        after = self.output(self.state[token])
+        if self.same(before, after):
+            return
+        for t in self._outputs(token):
+            t.delete()
+        if after is not None:
+            for child in self.children:
+                child.left_activation(token, after[0])
+
+    def restore(self):
+        """Rebuilds the state from the memories, without passing on tokens"""
+        self.state = {}
+        for token in self.parent.tokens:
+            self.state[token] = state = self.initial()
+            for wme in self._wmes_for(token):
+                state = self.state[token] = self.add(state, wme)
+
+    def left_activation(self, token):
+        self.activations += 1
+        self.state[token] = state = self.initial()
+        for wme in self._wmes_for(token):
+            state = self.state[token] = self.add(state, wme)
+        output = self.output(state)
+        if output is not None:
+            for child in self.children:
+                child.left_activation(token, output[0])
+
+    def right_activation(self, wme):
+        self.activations += 1
+        for token in self._tokens_for(wme):
+            state = self.state.get(token)
+            if state is not None:
+                before = self.output(state)
+                self.state[token] = self.add(state, wme)
+                self._update(token, before)
+
+    def right_retraction(self, wme):
+        for token in self._tokens_for(wme):
+            state = self.state.get(token)
+            if state is not None:
+                before = self.output(state)
+                self.state[token] = self.remove(state, wme)
+                self._update(token, before)
+
+
+class NegativeNode(CountingNode):
+    """Passes on the tokens that no WME joins with, or with exists, that some WME joins with
+
+    The state of a token is the number of WMEs joining it.
+    """
+
+    def __init__(self, exists=False, **kwargs):
+        super().__init__(type="exists-node" if exists else "negative-node", **kwargs)
+        self.exists = exists
+        self.options = {"exists": exists}
+
+    def initial(self):
+        return 0
+
+    def add(self, count, wme):
+        return count + 1
+
+    def remove(self, count, wme):
+        return count - 1
+
+    def output(self, count):
+        if (count > 0) == self.exists:
+            return (None,)
+        return None
+
+
+class AggregateState:
+    """Running count, sum, min and max of the values of the WMEs joining a token
+
+    Min and max keep a heap each, with removed values dropped lazily.
+    """
+
+    __slots__ = ("count", "total", "values", "low", "high")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.values = {}
+        self.low = []
+        self.high = []
+
+    def add(self, value=None):
+        self.count += 1
+        if value is None:
+            return
+        self.total += value
+        n = self.values.get(value, 0)
+        if n == 0:
+            heapq.heappush(self.low, value)
+            heapq.heappush(self.high, -value)
+        self.values[value] = n + 1
+
+    def remove(self, value=None):
+        self.count -= 1
+        if value is None:
+            return
+        self.total -= value
+        n = self.values.pop(value) - 1
+        if n > 0:
+            self.values[value] = n
+
+    def min(self):
+        while self.low and self.low[0] not in self.values:
+            heapq.heappop(self.low)
+        return self.low[0] if self.low else None
+
+    def max(self):
+        while self.high and -self.high[0] not in self.values:
+            heapq.heappop(self.high)
+        return -self.high[0] if self.high else None
+
+
+class AggregateNode(CountingNode):
+    """Passes on each token with a Fact holding an aggregate of the WMEs joining it
+
+    The Fact is Fact(function, attr, result), for the attribute of the
+    aggregated condition. It is passed on when the result passes the
+    comparison, if one is given; sum, min and max need at least one WME.
+    """
+
+    def __init__(self, function="count", operand=None, target=None, attr=None, **kwargs):
+        super().__init__(type="aggregate-node", **kwargs)
+        assert function in Aggregate.FUNCTIONS
+        self.function = function
+        self.operand = operand
+        self.target = target
+        self.attr = attr
+        self.options = {"function": function, "operand": operand, "target": target, "attr": attr}
+
+    def initial(self):
+        return AggregateState()
+
+    def add(self, state, wme):
+        state.add(_bound(wme.value) if self.function != "count" else None)
+        return state
+
+    def remove(self, state, wme):
+        state.remove(_bound(wme.value) if self.function != "count" else None)
+        return state
+
+    def result(self, state):
+        if self.function == "count":
+            return state.count
+        if state.count == 0:
+            return None
+        if self.function == "sum":
+            return state.total
+        return state.min() if self.function == "min" else state.max()
+
+    def output(self, state):
+        result = self.result(state)
+        if result is None and self.function != "count":
+            return None
+        if self.operand is not None and not AlphaNode.TEST_OPERATOR[self.operand](
+            result, self.target
+        ):
+            return None
+        return (Fact(self.function, self.attr, result),)
+
+    def same(self, before, after):
+        if before is None or after is None:
+            return before is after
+        return before[0].value == after[0].value
+
+
 class BetaMemoryNode(Node):
     def __init__(self, **kwargs):
         super().__init__(type="beta-memory-node", **kwargs)
         self.tokens = {}
+        self.indexes = {}
 
     def __json__(self):
         doc = super().__json__()
-        doc.update({"tokens": {str(k): v for k, v in self.tokens.items()}})
+        doc.update({"tokens": list(self.tokens)})
         return doc
 
-    def retract_wme(self, wme):
-        if wme.id in self.tokens:
-            self.tokens.pop(wme.id)
+    def add_index(self, position, field):
+        """Returns the index of the tokens on the bound value of field of token[position]"""
+        index = self.indexes.get((position, field))
+        if index is None:
+            index = self.indexes[(position, field)] = JoinIndex()
+            for token in self.tokens:
+                index.add(_bound(getattr(token[position], field)), token, token)
+        return index
+
+    def remove_token(self, token):
+        if self.tokens.pop(token, None) is None:
+            return
+        for (position, field), index in self.indexes.items():
+            index.remove(_bound(getattr(token[position], field)), token)
+        self.parent.unlink(token)
+        for child in self.children:
+            child.forget(token)
+
+    def store(self, token):
+        """Stores a token without activating the join nodes below"""
+        self.tokens[token] = token
+        for (position, field), index in self.indexes.items():
+            index.add(_bound(getattr(token[position], field)), token, token)
+        self.parent.link(token)
 
     def left_activation(self, token, wme):
-        token = token.copy()
-        token.append(wme)
-        self.tokens[wme.id] = token
-        self.net._add_retraction(wme, self)
+        token = Token(token, wme, self)
+        self.store(token)
+        self.activations += 1
         for child in self.children:
             assert isinstance(child, BetaNode)
             child.left_activation(token)
 
 
 class ProductionNode(Node):
-    def __init__(self, callback=lambda x: x, **kwargs):
+    def __init__(self, callback=lambda x: x, salience=0, conds=(), **kwargs):
         super().__init__(type="production-node", **kwargs)
         self.callback = callback
+        self.salience = salience
+        self.conds = conds
         self.tokens = {}
 
     def __json__(self):
         doc = super().__json__()
         doc.update(
-            {"callback": str(self.callback), "tokens": {str(k): v for k, v in self.tokens.items()}}
+            {"callback": str(self.callback), "salience": self.salience, "tokens": list(self.tokens)}
         )
         return doc
 
-    def retract_wme(self, wme):
-        if wme.id in self.tokens:
-            self.tokens.pop(wme.id)
+    def remove_token(self, token):
+        activation = self.tokens.pop(token, None)
+        if activation is None:
+            return
+        activation.active = False
+        self.parent.unlink(token)
+
+    def store(self, token, activation):
+        self.tokens[token] = activation
+        self.parent.link(token)
 
     def left_activation(self, token, wme):
-        token = token.copy()
-        token.append(wme)
-        self.net._add_retraction(wme, self)
-        self.tokens.setdefault(wme.id, []).append(lambda: self.callback(self.net, token))
+        token = Token(token, wme, self)
+        activation = Activation(self, token)
+        self.net.agenda.append(activation)
+        self.store(token, activation)
+        self.activations += 1
+
+    def bind(self, token):
+        """Returns the WMEs of token with ids and values bound to the variables of conds"""
+        return [_bind(cond, wme) for cond, wme in zip(self.conds, token.to_list())]
+
+
+def _bind(cond, wme):
+    if not isinstance(cond, Cond):
+        return wme
+    wme_id, value = wme.id, wme.value
+    if not isinstance(wme_id, Var):
+        wme_id = Var(cond.id, bound=wme_id)
+    if isinstance(cond.target, Var) and not isinstance(value, Var):
+        value = Var(cond.target.identity, bound=value)
+    return Fact(wme_id, wme.attr, value)
+
+
+class Activation:
+    __slots__ = ("production", "token", "active")
+
+    def __init__(self, production, token):
+        self.production = production
+        self.token = token
+        self.active = True
+
+    def __json__(self):
+        return self.token.to_list()
+
+    def fire(self, net):
+        production = self.production
+        start = timer() if profiler.enabled else None
+        production.callback(net, production.bind(self.token))
+        if start is not None:
+            production.time += timer() - start
+
+
+class Agenda:
+    """The activations of productions waiting to be fired
+
+    Activations are queued per salience, so adding one is O(1). When taken,
+    activations of productions with higher salience come first, and within a
+    salience they are ordered by the conflict resolution strategy:
+
+        - "fifo": the oldest activation first
+        - "recency": the newest activation first
+
+    Activations are deactivated, not removed, when their WMEs are retracted,
+    and skipped when taken.
+    """
+
+    STRATEGIES = ("fifo", "recency")
+
+    def __init__(self, strategy="fifo"):
+        assert strategy in self.STRATEGIES
+        self.strategy = strategy
+        self._queues = {}
+
+    def __len__(self):
+        return sum(1 for q in self._queues.values() for a in q if a.active)
+
+    def append(self, activation):
+        salience = activation.production.salience
+        queue = self._queues.get(salience)
+        if queue is None:
+            queue = self._queues[salience] = []
+        queue.append(activation)
+
+    def pending(self):
+        """Returns the active activations, without removing them, in the order they were added"""
+        return [a for q in self._queues.values() for a in q if a.active]
+
+    def take(self):
+        """Removes all activations and returns the active ones in firing order"""
+        queues, self._queues = self._queues, {}
+        activations = []
+        for salience in sorted(queues, reverse=True):
+            queue = queues[salience]
+            if self.strategy == "recency":
+                queue.reverse()
+            activations += [a for a in queue if a.active]
+        return activations
 
 
 class Rete:
-    def __init__(self):
-        self._alpha_root = AlphaNode(None, net=self)
+    def __init__(self, strategy="fifo"):
+        self._symbols = {}
+        self._nodes = []
+        self._alpha_root = AlphaRootNode(net=self)
         self._prod_memory = {}
         self._wmes = {}
+        self._pending = None
+        self._depth = 0
+        self.agenda = Agenda(strategy)
 
     def __json__(self):
         return {"_type": "rete-network", "prod_memory": self._prod_memory, "wmes": list(self._wmes)}
@@ -238,19 +914,128 @@ class Rete:
 
         print(json.dumps(self, indent=4, default=lambda x: x.__json__()))
 
+    def save(self, path):
+        """Writes a binary snapshot of the network and its memories to path
+
+        See triton.rete_snapshot for the format.
+
+        Returns:
+            a reference to the rete network
+        """
+        from triton import rete_snapshot
+
+        rete_snapshot.save(self, path)
+        return self
+
+    @staticmethod
+    def load(path, callbacks=None):
+        """Reads a network written by Rete.save
+
+        Args:
+            path: the snapshot file
+            callbacks: {name: callable} for production callbacks, like lambdas,
+                that cannot be imported by their module and name
+
+        Returns:
+            a new Rete instance
+        """
+        from triton import rete_snapshot
+
+        return rete_snapshot.load(path, callbacks)
+
+    def gensym(self, prefix):
+        self._symbols[prefix] = self._symbols.get(prefix, 0) + 1
+        return prefix + "_" + str(self._symbols[prefix])
+
+    def nodes(self):
+        """Returns every node in the network, in the order they were created"""
+        return list(self._nodes)
+
+    def stats(self):
+        """Returns statistics about the size and activity of the network
+
+        Activations are counted for every node. Time is only measured while
+        the profiler is enabled: for join nodes it is the time spent looking
+        up matches, for production nodes the time spent in the callback.
+
+        Returns:
+            a dict with:
+                - "nodes": {node type: number of nodes}
+                - "memory": {node type: number of WMEs or tokens stored}
+                - "wmes": number of WMEs in working memory
+                - "agenda": number of pending activations
+                - "activations": {node name: number of activations}
+                - "time": {node name: seconds}
+                - "productions": {node name: callback name}
+        """
+        stats = {
+            "nodes": {},
+            "memory": {},
+            "wmes": len(self._wmes),
+            "agenda": len(self.agenda),
+            "activations": {},
+            "time": {},
+            "productions": {},
+        }
+        for node in self.nodes():
+            if node is self._alpha_root:
+                continue
+            stats["nodes"][node.type] = stats["nodes"].get(node.type, 0) + 1
+            if isinstance(node, AlphaMemoryNode):
+                size = len(node.wmes)
+            elif isinstance(node, (BetaMemoryNode, ProductionNode)):
+                size = len(node.tokens)
+            elif isinstance(node, CountingNode):
+                size = len(node.state)
+            else:
+                size = None
+            if size is not None:
+                stats["memory"][node.type] = stats["memory"].get(node.type, 0) + size
+            stats["activations"][node.name] = node.activations
+            if node.time:
+                stats["time"][node.name] = node.time
+            if isinstance(node, ProductionNode):
+                stats["productions"][node.name] = getattr(
+                    node.callback, "__name__", str(node.callback)
+                )
+        return stats
+
     def _add_retraction(self, wme, node):
-        self._wmes.setdefault(((wme.id, wme.attr)), set()).add(node)
+        self._wmes.setdefault((_bound(wme.id), wme.attr), set()).add(node)
+
+    def _create_beta_node(
+        self,
+        parent=None,
+        alpha_memory=None,
+        tests=(),
+        production=None,
+        salience=0,
+        conds=(),
+        cond=None,
+    ):
+        cls, options = BetaNode, {}
+        if isinstance(cond, Not):
+            cls, options = NegativeNode, {"exists": isinstance(cond, Exists)}
+        elif isinstance(cond, Aggregate):
+            cls = AggregateNode
+            options = {
+                "function": cond.function,
+                "operand": cond.operand,
+                "target": cond.target,
+                "attr": cond.cond.attr,
+            }
 
-    def _create_beta_node(self, parent=None, alpha_memory=None, production=None):
         for c in alpha_memory.children:
-            if isinstance(c, BetaNode) and c.parent == parent:
+            if type(c) is cls and c.parent == parent and c.tests == tests and c.options == options:
                 bnode = c
                 break
         else:
-            bnode = BetaNode(parent=parent, alpha_memory=alpha_memory, net=self)
+            bnode = cls(parent=parent, alpha_memory=alpha_memory, tests=tests, net=self, **options)
 
         if production is not None:
-            return self._create_production(parent=bnode, callback=production)
+            return self._create_production(
+                parent=bnode, callback=production, salience=salience, conds=conds
+            )
 
         return bnode.add_memory()
 
@@ -263,7 +1048,8 @@ class Rete:
         """Adds a WME to the system
 
         WMEs with identical "id" and "attr" attributes will be retracted from
-        the network prior to adding a WME.
+        the network prior to adding a WME. Inside a transaction, the WME is
+        held back until the transaction ends.
 
         Args:
             wme: a WME instance on the form: wme("id", "attr", "value")
@@ -271,55 +1057,138 @@ class Rete:
         Returns:
             a reference to the rete network
         """
-        self.retract_wme(wme)
+        if self._pending is not None:
+            self._pending[(_bound(wme.id), wme.attr)] = (wme, True)
+            return self
+        self._retract(wme)
         self._alpha_root.add_wme(wme)
         return self
 
+    def add_wmes(self, wmes):
+        """Adds a number of WMEs in one transaction
+
+        Returns:
+            a reference to the rete network
+        """
+        with self.transaction():
+            for wme in wmes:
+                self.add_wme(wme)
+        return self
+
     def retract_wme(self, wme):
         """Retract a WME from the network
 
-        Retracting a WME from the system will remove the WME from all memory nodes
+        Retracting a WME from the system will remove the WME from all memory nodes,
+        along with the tokens and pending activations derived from it
 
         Returns:
             a reference to the rete network
         """
-        for node in self._wmes.pop((wme.id, wme.attr), ()):
-            node.retract_wme(wme)
+        if self._pending is not None:
+            self._pending[(_bound(wme.id), wme.attr)] = (wme, False)
+            return self
+        self._retract(wme)
+        return self
+
+    def retract_wmes(self, wmes):
+        """Retracts a number of WMEs in one transaction
+
+        Returns:
+            a reference to the rete network
+        """
+        with self.transaction():
+            for wme in wmes:
+                self.retract_wme(wme)
         return self
 
-    def production(self, *conds, production):
+    def _retract(self, wme):
+        for node in self._wmes.pop((_bound(wme.id), wme.attr), ()):
+            node.retract_wme(wme)
+
+    @contextmanager
+    def transaction(self):
+        """Holds back WME changes until the outermost transaction ends
+
+        Changes to the same (id, attr) are coalesced, so only the last one is
+        propagated through the network. If the block raises, the changes made
+        in it are discarded, also when an outer block goes on.
+
+        Usage:
+            with net.transaction():
+                net.add_wme(Fact("a", "count", 1))
+                net.add_wme(Fact("a", "count", 2))
+            net.fire()
+        """
+        if self._pending is None:
+            self._pending = {}
+        saved = dict(self._pending)
+        self._depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._depth -= 1
+            self._pending = saved if self._depth else None
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            pending, self._pending = self._pending, None
+            for wme, add in pending.values():
+                self._retract(wme)
+                if add:
+                    self._alpha_root.add_wme(wme)
+
+    def production(self, *conds, production, salience=0):
         """Adds a production consisting of a set of tests with a corresponding action
 
+        Besides Cond, the conditions after the first can be Not, Exists, or one
+        of the aggregates Count, Sum, Min and Max wrapping a Cond.
+
         Args:
             conds: n number of RETE_TEST instances describing the tests run
             production: a callback taking two arguments, net and token.
                 - net is the Rete instance
-                - token: is a list of matched wmes
+                - token: is a list of matched wmes, with None for Not and
+                  Exists conditions, and Fact(function, attr, result) for
+                  aggregates
+            salience: activations of productions with higher salience are fired first
         Returns:
             a reference to the rete network
         """
         bmemory = None
-        for test in conds:
+        for i, cond in enumerate(conds):
+            test = cond if isinstance(cond, Cond) else cond.cond
             amemory = self._alpha_root.add_test(test).add_memory()
             bmemory = self._create_beta_node(
                 parent=bmemory,
                 alpha_memory=amemory,
-                production=production if test == conds[-1] else None,
+                tests=join_tests(conds[:i], test),
+                production=production if i == len(conds) - 1 else None,
+                salience=salience,
+                conds=conds,
+                cond=cond,
             )
         return self
 
     def fire(self):
         """Runs all actions associated with triggered productions
 
+        Activations are taken from the agenda in the order given by its
+        conflict resolution strategy. Activations added by the actions are
+        left for the next call, and activations whose WMEs an action retracts
+        are not fired.
+
         Returns:
             a reference to the rete network
         """
-        fire_prod = []
-        for node in self._prod_memory.values():
-            fire_prod += sum(node.tokens.values(), [])
-            node.tokens.clear()
-        for prod in fire_prod:
-            prod()
+        start = timer() if profiler.enabled else None
+        fired = 0
+        for activation in self.agenda.take():
+            if activation.active:
+                activation.fire(self)
+                fired += 1
+        if start is not None:
+            profiler.record("rete.fire", start)
+            profiler.count("rete.fire.activations", fired)
         return self
 
 
@@ -407,6 +1276,76 @@ class C(Cond):
         return Cond(self.id, self.attr, "==", target)
 
 
+class Not:
+    """A condition holding when no WME joins with the earlier conditions and passes cond
+
+    Usage:
+        net.production(Cond("x", "on", Var("y")), Not(Cond("y", "color", "red")), ...)
+    """
+
+    def __init__(self, cond):
+        self.cond = cond
+
+    def __json__(self):
+        return self.__str__()
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.cond)
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class Exists(Not):
+    """A condition holding when at least one WME joins and passes cond, without binding it"""
+
+
+class Aggregate:
+    """A condition on an aggregate of the WMEs joining the earlier conditions and passing cond
+
+    Sum, min and max aggregate the WME values. Without a comparison, the
+    condition holds whenever the aggregate is defined.
+
+    Usage:
+        net.production(Cond("x", "is", "table"), Count(Cond("y", "on", Var("x")), ">", 2), ...)
+    """
+
+    FUNCTIONS = ("count", "sum", "min", "max")
+    function = None
+
+    def __init__(self, cond, operand=None, target=None):
+        self.cond = cond
+        self.operand = operand
+        self.target = target
+
+    def __json__(self):
+        return self.__str__()
+
+    def __repr__(self):
+        return "{}({!r}, {}, {})".format(
+            self.__class__.__name__, self.cond, self.operand, self.target
+        )
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class Count(Aggregate):
+    function = "count"
+
+
+class Sum(Aggregate):
+    function = "sum"
+
+
+class Min(Aggregate):
+    function = "min"
+
+
+class Max(Aggregate):
+    function = "max"
+
+
 class Var:
     def __init__(self, identity, bound=None):
         self.identity = identity
@@ -0,0 +1,386 @@
+"""Sharded evaluation of a Rete network over worker processes
+
+WMEs are partitioned by the hash of their id across a number of worker
+processes. Every worker runs a Rete network holding the id-local
+productions: those whose conditions only join on the id of the first one,
+so all the WMEs a token is built from live on the same shard. The other
+productions run in a local network in the coordinating process, which sees
+every WME.
+
+Changes are held back until fire(), then sent to the workers as one batch
+each, written to shared memory instead of pickling every fact: the distinct
+ids, attributes and values in the tagged encoding of triton.rete_snapshot,
+followed by an int64 array of indices into them. While the workers
+match, the coordinator updates its local network; the pending activations
+of all networks are then merged into one agenda and the callbacks are run
+in the coordinating process. Activations are ordered by salience, then by
+the order of the changes that caused them, following the conflict
+resolution strategy.
+
+Usage:
+    with ShardedRete(shards=4) as net:
+        net.production(Cond("x", "color", "red"), Cond("x", "size", "big"), production=print)
+        net.add_wmes(facts)
+        net.fire()
+"""
+
+import multiprocessing
+import struct
+import traceback
+from contextlib import contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from triton.rete import Agenda, Cond, Fact, Rete, _bind, _bound, join_tests
+from triton.rete_snapshot import _Values, decode_cond, decode_value, encode_cond, encode_value
+
+
+def id_local(conds):
+    """Tells whether every condition after the first joins only on the id of the earlier ones
+
+    Such productions can be matched on a shard holding all WMEs of one id.
+    Negated, existential and aggregate conditions that share no variable
+    match every WME, and are not id-local.
+    """
+    for i, cond in enumerate(conds):
+        test = cond if isinstance(cond, Cond) else cond.cond
+        tests = join_tests(conds[:i], test)
+        if i > 0 and not tests:
+            return False
+        if any(test[1:] != ("id", "id") for test in tests):
+            return False
+    return True
+
+
+class _StampedAgenda(Agenda):
+    """An agenda remembering the sequence number of the change behind each activation"""
+
+    def __init__(self, strategy="fifo"):
+        super().__init__(strategy)
+        self.seq = 0
+        self._stamps = {}
+
+    def append(self, activation):
+        super().append(activation)
+        self._stamps[activation] = self.seq
+
+    def take_stamped(self):
+        """Removes all activations and returns (seq, activation) for the active ones"""
+        stamps, self._stamps = self._stamps, {}
+        return [(stamps[a], a) for a in self.take()]
+
+
+def _pack(values, ints):
+    """Writes a batch: the interned values, then a flat int64 array of indices and numbers"""
+    out = bytearray(8)
+    encode_value(values.values, out)
+    struct.pack_into("<Q", out, 0, len(out))
+    out += bytes(-len(out) % 8)
+    out += np.asarray(ints, dtype="<i8").tobytes()
+    return out
+
+
+def _unpack(data):
+    (end,) = struct.unpack_from("<Q", data, 0)
+    values = decode_value(data, 8)[0]
+    return values, np.frombuffer(data, dtype="<i8", offset=end + -end % 8).tolist()
+
+
+def _apply(net, values, ops):
+    """Applies a batch of changes, five ints each: seq, add, and the indices of id, attr and value"""
+    for i in range(0, len(ops), 5):
+        seq, add, wme_id, attr, value = ops[i : i + 5]
+        net.agenda.seq = seq
+        wme = Fact(values[wme_id], values[attr], values[value])
+        if add:
+            net.add_wme(wme)
+        else:
+            net.retract_wme(wme)
+
+
+class _Outbox(object):
+    """A shared memory block written by its owner, grown as needed"""
+
+    def __init__(self, size=1 << 16):
+        self.size = size
+        self.shm = None
+
+    def write(self, data):
+        n = len(data)
+        if self.shm is None or self.shm.size < n:
+            self.close()
+            self.size = max(self.size, 2 * n)
+            self.shm = SharedMemory(create=True, size=self.size)
+        self.shm.buf[:n] = data
+        return self.shm.name, n
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class _Inbox(object):
+    """Reads the blocks of an _Outbox owned by another process"""
+
+    def __init__(self):
+        self.shm = None
+
+    def read(self, name, n):
+        if self.shm is None or self.shm.name != name:
+            self.close()
+            self.shm = SharedMemory(name=name)
+        return bytes(self.shm.buf[:n])
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+
+
+def _ignore(net, token):
+    pass
+
+
+def _serve(conn, rules, strategy):
+    """Runs a shard: applies the batches sent over conn and answers with the activations"""
+    net = Rete(strategy)
+    net.agenda = _StampedAgenda(strategy)
+    for conds, salience in decode_value(rules, 0)[0]:
+        net.production(*[decode_cond(c) for c in conds], production=_ignore, salience=salience)
+    index = {node: i for i, node in enumerate(net._prod_memory.values())}
+
+    inbox, outbox = _Inbox(), _Outbox()
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            try:
+                _apply(net, *_unpack(inbox.read(*message)))
+                values, activations = _Values(), []
+                for seq, a in net.agenda.take_stamped():
+                    wmes = a.token.to_list()
+                    activations += (index[a.production], seq, len(wmes))
+                    for wme in wmes:
+                        if wme is None:
+                            activations += (-1, -1, -1)
+                        else:
+                            activations += (values(wme.id), values(wme.attr), values(wme.value))
+                conn.send(("ok",) + outbox.write(_pack(values, activations)))
+            except Exception:
+                conn.send(("error", traceback.format_exc()))
+    finally:
+        inbox.close()
+        outbox.close()
+        conn.close()
+
+
+class ShardedRete(object):
+    """A Rete network with its WMEs partitioned by id over worker processes
+
+    Has the interface of Rete for adding productions and changing WMEs, but
+    all changes are held back until fire(), and productions must be added
+    before the first fire(). Callbacks are called with the ShardedRete as net.
+    Values must be ones the snapshot encoding knows.
+
+    Args:
+        shards: the number of worker processes
+        strategy: the conflict resolution strategy, "fifo" or "recency"
+    """
+
+    def __init__(self, shards=2, strategy="fifo"):
+        assert strategy in Agenda.STRATEGIES
+        self.shards = shards
+        self.strategy = strategy
+        self.local = Rete(strategy)
+        self.local.agenda = _StampedAgenda(strategy)
+        self._rules = []
+        self._global = False
+        self._workers = None
+        self._pending = {}
+        self._changes = None
+        self._depth = 0
+        self._seq = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def shard(self, wme_id):
+        """Returns the index of the shard holding the WMEs of wme_id"""
+        return hash(_bound(wme_id)) % self.shards
+
+    def production(self, *conds, production, salience=0):
+        """Adds a production, see Rete.production
+
+        Id-local productions are matched on the shards, the others locally.
+
+        Returns:
+            a reference to the network
+        """
+        if self._workers is not None:
+            raise RuntimeError("productions must be added before the first fire()")
+        if id_local(conds):
+            self._rules.append((conds, salience, production))
+        else:
+            self.local.production(*conds, production=production, salience=salience)
+            self._global = True
+        return self
+
+    def add_wme(self, wme):
+        self._change(wme, True)
+        return self
+
+    def add_wmes(self, wmes):
+        with self.transaction():
+            for wme in wmes:
+                self.add_wme(wme)
+        return self
+
+    def retract_wme(self, wme):
+        self._change(wme, False)
+        return self
+
+    def retract_wmes(self, wmes):
+        with self.transaction():
+            for wme in wmes:
+                self.retract_wme(wme)
+        return self
+
+    def _change(self, wme, add):
+        changes = self._pending if self._changes is None else self._changes
+        changes[(_bound(wme.id), wme.attr)] = (wme, add)
+
+    @contextmanager
+    def transaction(self):
+        """Holds back changes until the outermost block ends
+
+        The changes made in a block that raises are discarded, also when an
+        outer block goes on. Changes are coalesced per (id, attr) until the
+        next fire() either way.
+        """
+        if self._changes is None:
+            self._changes = {}
+        saved = dict(self._changes)
+        self._depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._depth -= 1
+            self._changes = saved if self._depth else None
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            changes, self._changes = self._changes, None
+            self._pending.update(changes)
+
+    def _start(self):
+        # workers must share the resource tracker, which then sees one owner per block
+        resource_tracker.ensure_running()
+        out = bytearray()
+        encode_value([[[encode_cond(c) for c in conds], s] for conds, s, _ in self._rules], out)
+        rules = bytes(out)
+        self._workers = []
+        for _ in range(self.shards):
+            conn, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_serve, args=(child, rules, self.strategy), daemon=True
+            )
+            process.start()
+            child.close()
+            self._workers.append((process, conn, _Outbox(), _Inbox()))
+
+    def close(self):
+        """Stops the worker processes and frees the shared memory"""
+        if self._workers is None:
+            return
+        for process, conn, outbox, inbox in self._workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process, conn, outbox, inbox in self._workers:
+            process.join()
+            conn.close()
+            outbox.close()
+            inbox.close()
+        self._workers = []
+
+    def _flush(self):
+        """Propagates the pending changes and returns the activations in firing order"""
+        pending, self._pending = self._pending, {}
+        tables = [_Values() for _ in range(self.shards)]
+        batches = [[] for _ in range(self.shards)]
+        values, local = _Values(), []
+        for wme, add in pending.values():
+            self._seq += 1
+            if self._rules:
+                i = self.shard(wme.id)
+                t = tables[i]
+                batches[i] += (self._seq, add, t(wme.id), t(wme.attr), t(wme.value))
+            if self._global:
+                local += (self._seq, add, values(wme.id), values(wme.attr), values(wme.value))
+
+        if self._rules and not self._workers:
+            if self._workers is not None:
+                raise RuntimeError("the network is closed")
+            self._start()
+        sent = []
+        for table, batch, worker in zip(tables, batches, self._workers or ()):
+            if batch:
+                worker[1].send(worker[2].write(_pack(table, batch)))
+                sent.append(worker)
+
+        _apply(self.local, values.values, local)
+        activations = [
+            (a.production.salience, seq, a.production.callback, a.production.bind(a.token))
+            for seq, a in self.local.agenda.take_stamped()
+        ]
+
+        errors = []
+        for process, conn, outbox, inbox in sent:
+            message = conn.recv()
+            if message[0] != "ok":
+                errors.append(message[1])
+                continue
+            table, ints = _unpack(inbox.read(*message[1:]))
+            i = 0
+            while i < len(ints):
+                index, seq, n = ints[i : i + 3]
+                conds, salience, callback = self._rules[index]
+                token = []
+                for cond, j in zip(conds, range(i + 3, i + 3 + 3 * n, 3)):
+                    if ints[j] < 0:
+                        token.append(None)
+                    else:
+                        wme = Fact(table[ints[j]], table[ints[j + 1]], table[ints[j + 2]])
+                        token.append(_bind(cond, wme))
+                activations.append((salience, seq, callback, token))
+                i += 3 + 3 * n
+        if errors:
+            raise RuntimeError("a shard failed:\n" + errors[0])
+
+        if self.strategy == "recency":
+            activations.reverse()
+            activations.sort(key=lambda a: (-a[0], -a[1]))
+        else:
+            activations.sort(key=lambda a: (-a[0], a[1]))
+        return activations
+
+    def fire(self):
+        """Propagates the pending changes and runs the actions of the triggered productions
+
+        Changes made by the actions are left for the next call.
+
+        Returns:
+            a reference to the network
+        """
+        for _, _, callback, token in self._flush():
+            callback(self, token)
+        return self
@@ -0,0 +1,412 @@
+"""Binary snapshots of a Rete network
+
+A snapshot holds the compiled node graph, the alpha and beta memories and the
+pending agenda, so a network can be brought back without adding its
+productions and facts again. The format does not use pickle: values are
+written with a small tagged encoding that knows None, bool, int, float, str,
+bytes, tuples, lists and Var, and facts and tokens are stored as int32 arrays
+that are read straight from a memory map.
+
+Production callbacks are stored by reference, as "module:qualname". Callbacks
+that cannot be imported by that name, like lambdas, must be passed to load(),
+by reference, qualname or name.
+
+Layout, little endian:
+    magic (8 bytes), version (uint32), number of sections (uint32)
+    per section: tag (4 bytes), length (uint64), payload padded to 8 bytes
+
+Sections:
+    META: strategy, node counters, node graph and agenda, as one encoded value
+    VALS: the distinct ids, attributes and values of the facts
+    FACT: int32 (n, 3) array of value indices for id, attr and value
+    AMEM: int32 (n, 2) array of (alpha memory node, fact)
+    TOKN: int32 (n, 3) array of (parent token or -1, fact or -1, node)
+
+Version 2 added negated, existential and aggregate conditions and nodes.
+"""
+
+import gc
+import importlib
+import mmap
+import struct
+from contextlib import contextmanager
+
+import numpy as np
+
+from triton.rete import (
+    Activation,
+    Aggregate,
+    AggregateNode,
+    AlphaMemoryNode,
+    BetaMemoryNode,
+    BetaNode,
+    Cond,
+    Count,
+    CountingNode,
+    Exists,
+    Fact,
+    Max,
+    Min,
+    NegativeNode,
+    Not,
+    ProductionNode,
+    Rete,
+    Sum,
+    Token,
+    Var,
+)
+
+MAGIC = b"TRETESNP"
+VERSION = 2
+READABLE_VERSIONS = (1, 2)
+
+_JOIN_NODES = {
+    "beta-node": BetaNode,
+    "negative-node": NegativeNode,
+    "exists-node": NegativeNode,
+    "aggregate-node": AggregateNode,
+}
+
+_HEADER = struct.Struct("<8sII")
+_SECTION = struct.Struct("<4sQ")
+_COLUMNS = {b"FACT": 3, b"AMEM": 2, b"TOKN": 3}
+
+
+def encode_value(value, out):
+    """Appends the tagged encoding of value to the bytearray out"""
+    if value is None:
+        out += b"N"
+    elif value is True:
+        out += b"T"
+    elif value is False:
+        out += b"F"
+    elif isinstance(value, int):
+        if -(2**63) <= value < 2**63:
+            out += b"i" + struct.pack("<q", value)
+        else:
+            _encode_bytes(b"I", str(value).encode("ascii"), out)
+    elif isinstance(value, float):
+        out += b"d" + struct.pack("<d", value)
+    elif isinstance(value, str):
+        _encode_bytes(b"s", value.encode("utf-8"), out)
+    elif isinstance(value, bytes):
+        _encode_bytes(b"b", value, out)
+    elif isinstance(value, (tuple, list)):
+        out += (b"t" if isinstance(value, tuple) else b"l") + struct.pack("<I", len(value))
+        for item in value:
+            encode_value(item, out)
+    elif isinstance(value, Var):
+        out += b"V"
+        encode_value(value.identity, out)
+        encode_value(value.bound, out)
+    else:
+        raise TypeError("cannot snapshot a value of type {}".format(type(value).__name__))
+
+
+def _encode_bytes(tag, data, out):
+    out += tag + struct.pack("<I", len(data)) + data
+
+
+def decode_value(data, offset):
+    """Reads the value encoded at offset in data
+
+    Returns:
+        (value, offset just past it)
+    """
+    tag = data[offset : offset + 1]
+    offset += 1
+    if tag == b"N":
+        return None, offset
+    if tag == b"T":
+        return True, offset
+    if tag == b"F":
+        return False, offset
+    if tag == b"i":
+        return struct.unpack_from("<q", data, offset)[0], offset + 8
+    if tag == b"d":
+        return struct.unpack_from("<d", data, offset)[0], offset + 8
+    if tag in (b"s", b"b", b"I"):
+        (n,) = struct.unpack_from("<I", data, offset)
+        raw = bytes(data[offset + 4 : offset + 4 + n])
+        if tag == b"s":
+            value = raw.decode("utf-8")
+        elif tag == b"I":
+            value = int(raw)
+        else:
+            value = raw
+        return value, offset + 4 + n
+    if tag in (b"t", b"l"):
+        (n,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        items = []
+        for _ in range(n):
+            item, offset = decode_value(data, offset)
+            items.append(item)
+        return (tuple(items) if tag == b"t" else items), offset
+    if tag == b"V":
+        identity, offset = decode_value(data, offset)
+        bound, offset = decode_value(data, offset)
+        return Var(identity, bound=bound), offset
+    raise ValueError("unknown value tag {!r} in snapshot".format(tag))
+
+
+def _callback_ref(callback):
+    qualname = getattr(callback, "__qualname__", None)
+    if qualname is None:
+        qualname = "<{} instance>".format(type(callback).__qualname__)
+    return "{}:{}".format(getattr(callback, "__module__", None), qualname)
+
+
+def _resolve(ref, callbacks):
+    if ref in callbacks:
+        return callbacks[ref]
+    module, _, qualname = ref.partition(":")
+    for name in (qualname, qualname.rpartition(".")[2]):
+        if name in callbacks:
+            return callbacks[name]
+    if "<" not in qualname:
+        try:
+            obj = importlib.import_module(module)
+            for part in qualname.split("."):
+                obj = getattr(obj, part)
+            return obj
+        except (ImportError, AttributeError):
+            pass
+    raise ValueError("cannot find production callback {}, pass it in callbacks".format(ref))
+
+
+def encode_cond(cond):
+    """Returns a condition as a value encode_value can write"""
+    if isinstance(cond, Not):
+        return ("exists" if isinstance(cond, Exists) else "not", encode_cond(cond.cond), None, None)
+    if isinstance(cond, Aggregate):
+        return (cond.function, encode_cond(cond.cond), cond.operand, cond.target)
+    return [cond.id, cond.attr, cond.operand, cond.target]
+
+
+_CONDS = {"not": Not, "exists": Exists, "count": Count, "sum": Sum, "min": Min, "max": Max}
+
+
+def decode_cond(cond):
+    if isinstance(cond, tuple):
+        kind, inner, operand, target = cond
+        if kind in ("not", "exists"):
+            return _CONDS[kind](decode_cond(inner))
+        return _CONDS[kind](decode_cond(inner), operand, target)
+    return Cond(*cond)
+
+
+class _Values(object):
+    """Interns the values written to the VALS section"""
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def __call__(self, value):
+        try:
+            key = (type(value), value)
+            index = self._index.get(key)
+        except TypeError:
+            key = index = None
+        if index is None:
+            index = len(self.values)
+            self.values.append(value)
+            if key is not None:
+                self._index[key] = index
+        return index
+
+
+@contextmanager
+def _no_gc():
+    """Pauses the cyclic garbage collector, which otherwise runs over and over
+    while the many objects of a large network are created"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def save(net, path):
+    """Writes a snapshot of net to path
+
+    Args:
+        net: a Rete instance, not inside a transaction
+        path: the file to write
+    """
+    assert net._pending is None, "cannot snapshot a network inside a transaction"
+    with _no_gc():
+        _save(net, path)
+
+
+def _save(net, path):
+    nodes = net.nodes()
+    node_index = {node: i for i, node in enumerate(nodes)}
+
+    records = []
+    for node in nodes:
+        parent = node_index[node.parent] if node.parent is not None else -1
+        record = [node.type, node.name, parent]
+        if isinstance(node, BetaNode):
+            record += [node_index[node.alpha_memory], [list(t) for t in node.tests]]
+            record.append(sorted(node.options.items()))
+        elif isinstance(node, ProductionNode):
+            conds = [encode_cond(c) for c in node.conds]
+            record += [_callback_ref(node.callback), node.salience, conds]
+        elif not isinstance(node, (AlphaMemoryNode, BetaMemoryNode)):
+            record.append(encode_cond(node.test) if node.test is not None else None)
+        records.append(record)
+
+    values = _Values()
+    facts = []
+    fact_index = {}
+
+    def fact(wme):
+        if wme is None:
+            return -1
+        index = fact_index.get(id(wme))
+        if index is None:
+            index = fact_index[id(wme)] = len(facts)
+            facts.append((values(wme.id), values(wme.attr), values(wme.value)))
+        return index
+
+    alpha = []
+    tokens = []
+    token_index = {}
+    for node in nodes:
+        if isinstance(node, AlphaMemoryNode):
+            alpha += [(node_index[node], fact(wme)) for wme in node.wmes.values()]
+        elif isinstance(node, (BetaMemoryNode, ProductionNode)):
+            for token in node.tokens:
+                parent = token_index[token.parent] if token.parent is not None else -1
+                token_index[token] = len(tokens)
+                tokens.append((parent, fact(token.wme), node_index[node]))
+
+    agenda = [token_index[a.token] for a in net.agenda.pending()]
+    meta = [net.agenda.strategy, sorted(net._symbols.items()), records, agenda]
+
+    sections = []
+    for tag, payload in (
+        (b"META", meta),
+        (b"VALS", values.values),
+    ):
+        out = bytearray()
+        encode_value(payload, out)
+        sections.append((tag, bytes(out)))
+    for tag, rows in ((b"FACT", facts), (b"AMEM", alpha), (b"TOKN", tokens)):
+        array = np.array(rows, dtype="<i4").reshape(-1, _COLUMNS[tag])
+        sections.append((tag, array.tobytes()))
+
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(sections)))
+        for tag, payload in sections:
+            f.write(_SECTION.pack(tag, len(payload)))
+            f.write(payload)
+            f.write(b"\0" * (-len(payload) % 8))
+
+
+def _read_sections(data):
+    magic, version, count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a Rete snapshot")
+    if version not in READABLE_VERSIONS:
+        raise ValueError("unsupported Rete snapshot version {}".format(version))
+    sections = {}
+    offset = _HEADER.size
+    for _ in range(count):
+        tag, length = _SECTION.unpack_from(data, offset)
+        offset += _SECTION.size
+        sections[tag] = (offset, length)
+        offset += length + (-length % 8)
+    return sections
+
+
+def load(path, callbacks=None):
+    """Reads a network written by save()
+
+    Args:
+        path: the snapshot file
+        callbacks: {name: callable} for production callbacks that cannot be
+            imported, keyed by "module:qualname", qualname or name
+
+    Returns:
+        a new Rete instance
+    """
+    with _no_gc():
+        return _load(path, callbacks or {})
+
+
+def _load(path, callbacks):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        sections = _read_sections(data)
+        meta = decode_value(data, sections[b"META"][0])[0]
+        values = decode_value(data, sections[b"VALS"][0])[0]
+        arrays = {}
+        for tag, columns in _COLUMNS.items():
+            offset, length = sections[tag]
+            array = np.frombuffer(data, dtype="<i4", count=length // 4, offset=offset)
+            arrays[tag] = array.reshape(-1, columns).tolist()
+            del array
+
+    strategy, symbols, records, agenda = meta
+    net = Rete(strategy=strategy)
+    nodes = []
+    for record in records:
+        kind, name, parent = record[:3]
+        parent = nodes[parent] if parent >= 0 else None
+        if parent is None and kind == "alpha-node":
+            node = net._alpha_root
+        elif kind == "alpha-node":
+            node = parent.add_test(decode_cond(record[3]))
+        elif kind == "alpha-memory-node":
+            node = parent.add_memory()
+        elif kind in _JOIN_NODES:
+            node = _JOIN_NODES[kind](
+                parent=parent,
+                alpha_memory=nodes[record[3]],
+                tests=tuple(tuple(t) for t in record[4]),
+                net=net,
+                **dict(record[5] if len(record) > 5 else ()),
+            )
+        elif kind == "beta-memory-node":
+            node = parent.add_memory()
+        elif kind == "production-node":
+            node = net._create_production(
+                parent=parent,
+                callback=_resolve(record[3], callbacks),
+                salience=record[4],
+                conds=tuple(decode_cond(c) for c in record[5]),
+            )
+        else:
+            raise ValueError("unknown node type {} in snapshot".format(kind))
+        node.name = name
+        nodes.append(node)
+    net._symbols = dict(symbols)
+    net._prod_memory = {n.name: n for n in nodes if isinstance(n, ProductionNode)}
+
+    facts = [Fact(values[i], values[a], values[v]) for i, a, v in arrays[b"FACT"]]
+    for node, wme in arrays[b"AMEM"]:
+        nodes[node].store(facts[wme])
+
+    tokens = []
+    activations = {}
+    for parent, wme, node in arrays[b"TOKN"]:
+        node = nodes[node]
+        token = Token(
+            tokens[parent] if parent >= 0 else None, facts[wme] if wme >= 0 else None, node
+        )
+        tokens.append(token)
+        if isinstance(node, ProductionNode):
+            activations[len(tokens) - 1] = activation = Activation(node, token)
+            node.store(token, activation)
+        else:
+            node.store(token)
+    for index in agenda:
+        net.agenda.append(activations[index])
+    for node in nodes:
+        if isinstance(node, CountingNode):
+            node.restore()
+    return net
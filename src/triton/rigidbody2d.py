@@ -39,6 +39,8 @@ class RigidBody2d(object):
     ):
 
         self._world = world
+        self._array = None
+        self._index = None
         self._mass = mass
         self._inertia = inertia
         self._damping = damping
@@ -118,6 +120,8 @@ class RigidBody2d(object):
     @mass.setter
     def mass(self, mass):
         self._mass = mass
+        if self._array is not None:
+            self._array.mass[self._index] = mass
 
     @property
     def inertia(self):
@@ -126,20 +130,64 @@ class RigidBody2d(object):
     @inertia.setter
     def inertia(self, inertia):
         self._inertia = inertia
+        if self._array is not None:
+            self._array.inertia[self._index] = inertia
+
+    @property
+    def damping(self):
+        return self._damping
+
+    @damping.setter
+    def damping(self, damping):
+        self._damping = damping
+        if self._array is not None:
+            self._array.damping[self._index] = damping
+
+    def _bind(self, array, index):
+        """Turns the body into a view onto a row of a BodyArray"""
+        self._array = array
+        self._index = index
+        self._state = array.state[index]
+        self._applied_force = array.force[index]
+
+    def _unbind(self):
+        """Copies the row of the BodyArray back into the body"""
+        array, index = self._array, self._index
+        self._array = None
+        self._index = None
+        self._state = Vector([float(i) for i in array.state[index]])
+        self._applied_force = Vector2d(float(array.force[index, 0]), float(array.force[index, 1]))
+        self._applied_torque = float(array.torque[index])
 
     def update(self, time, time_slice):
+        if self._array is not None:
+            state = Vector([float(i) for i in self._state])
+            self._applied_torque = float(self._array.torque[self._index])
+            t, state = Integrator.rk4(time, time_slice, state, self._accel)
+            self._state[:] = state[:]
+            self._applied_force[:] = 0
+            self._array.torque[self._index] = 0
+            return
+
         t, self._state = Integrator.rk4(time, time_slice, self._state, self._accel)
         self._applied_force = Vector2d(0, 0)
         self._applied_torque = 0
 
     def apply_force_to_com(self, force):
-        self._applied_force += force
+        if self._array is not None:
+            self._applied_force[0] += force[0]
+            self._applied_force[1] += force[1]
+        else:
+            self._applied_force += force
 
     def apply_force(self, point_of_contact, force):
         rp = point_of_contact - self.pos
         torque = rp.perp().dot(force)
-        self._applied_force += force
-        self._applied_torque += torque
+        self.apply_force_to_com(force)
+        if self._array is not None:
+            self._array.torque[self._index] += torque
+        else:
+            self._applied_torque += torque
 
     @property
     def gravity(self):
@@ -150,6 +198,8 @@ class RigidBody2d(object):
     @gravity.setter
     def gravity(self, grav):
         self._gravity = grav
+        if self._array is not None:
+            self._array.gravity[self._index] = grav[0], grav[1]
 
     def _accel(self, time, state):
         v = Vector(
@@ -20,49 +20,204 @@
 
 
 from triton.vector2d import Vector2d
+from collections import Counter
 import math
 
 
 class SpatialHash(object):
-    def __init__(self, map_size=Vector2d(800, 800), grid_size=70):
+    """Uniform grid of buckets for finding nearby bodies
+
+    Cells are keyed by their integer (x, y) grid coordinates, so the grid
+    covers the whole plane and negative coordinates are not folded onto
+    other cells. The map_size argument is kept for compatibility only.
+
+    In incremental mode, which is the default, the cell span of each body
+    is remembered between updates and only bodies whose span changed are
+    moved between buckets.
+    """
+
+    def __init__(self, map_size=Vector2d(800, 800), grid_size=70, incremental=True):
         self._map_size = map_size
         self._grid_size = grid_size
+        self._incremental = incremental
         self.reset()
 
     def reset(self):
         self._grid = {}
+        self._spans = {}
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.moved = 0
+        self.rehashed = 0
+        self.inserted = 0
+        self.removed = 0
 
     def update(self, bodies):
-        self.reset()
+        """Brings the grid up to date with the current position of bodies
+
+        Bodies that were part of the previous update but are missing from
+        this one are removed from the grid.
+        """
+        if not isinstance(bodies, (list, tuple)):
+            bodies = list(bodies)
+        if not self._incremental:
+            self.reset()
+        self._reset_counters()
+
+        spans = self._spans
         for b in bodies:
-            self._add_body(b)
+            if b in spans:
+                self._move(b)
+            else:
+                self.insert(b)
+
+        if len(spans) > len(bodies):
+            for b in spans.keys() - set(bodies):
+                self.remove(b)
+
+    def insert(self, body):
+        span = self._span(body)
+        self._spans[body] = span
+        grid = self._grid
+        for key in self._cells(span):
+            grid.setdefault(key, {})[body] = None
+        self.inserted += 1
+
+    def remove(self, body):
+        span = self._spans.pop(body)
+        for key in self._cells(span):
+            self._discard(key, body)
+        self.removed += 1
+
+    def _discard(self, key, body):
+        bucket = self._grid[key]
+        del bucket[body]
+        if not bucket:
+            del self._grid[key]
+
+    def _move(self, body):
+        old = self._spans[body]
+        new = self._span(body)
+        if old == new:
+            return
 
-    def _add_body(self, body):
-        for i in self._sweep(body):
-            self._grid.setdefault(i, []).append(body)
+        self._spans[body] = new
+        self.moved += 1
+        grid = self._grid
+        for key in self._cells(old):
+            if not self._inside(key, new):
+                self._discard(key, body)
+                self.rehashed += 1
+        for key in self._cells(new):
+            if not self._inside(key, old):
+                grid.setdefault(key, {})[body] = None
+                self.rehashed += 1
 
     def _hash(self, x, y):
-        return x + y * int(self._map_size.x / self._grid_size)
+        return (x, y)
 
-    def _scale_to_grid(self, pos):
-        return Vector2d(
-            int(math.floor(pos.x / self._grid_size)), int(math.floor(pos.y / self._grid_size))
+    def _span(self, body):
+        pos = body.pos
+        r = body.radius
+        g = self._grid_size
+        return (
+            math.floor((pos[0] - r) / g),
+            math.floor((pos[1] - r) / g),
+            math.floor((pos[0] + r) / g),
+            math.floor((pos[1] + r) / g),
         )
 
-    def _sweep(self, body):
-        min = self._scale_to_grid(body.pos - body.radius)
-        max = self._scale_to_grid(body.pos + body.radius)
+    @staticmethod
+    def _inside(key, span):
+        return span[0] <= key[0] <= span[2] and span[1] <= key[1] <= span[3]
 
-        for x in range(int(min.x), int(max.x + 1)):
-            for y in range(int(min.y), int(max.y + 1)):
+    def _cells(self, span):
+        for x in range(span[0], span[2] + 1):
+            for y in range(span[1], span[3] + 1):
                 yield self._hash(x, y)
 
+    def _sweep(self, body):
+        span = self._spans.get(body)
+        if span is None:
+            span = self._span(body)
+        return self._cells(span)
+
     def nearby_objects(self, body):
+        """Yields every body sharing at least one cell with body, once each"""
+        grid = self._grid
+        seen = {body}
         for h in self._sweep(body):
-            try:
-                bucket = self._grid[h]
-                for o in bucket:
-                    if o != body:
-                        yield o
-            except:
-                pass
+            for o in grid.get(h, ()):
+                if o not in seen:
+                    seen.add(o)
+                    yield o
+
+    def query_pairs(self, body, overlap=True):
+        """Yields (body, other) for every body that may collide with body
+
+        Args:
+            body: the body to query
+            overlap: only yield bodies whose bounding box overlaps that of body
+        """
+        for o in self.nearby_objects(body):
+            if not overlap or self._overlaps(body, o):
+                yield body, o
+
+    def pairs(self, overlap=True):
+        """Yields each unordered pair of bodies sharing a cell exactly once
+
+        A pair is only reported from the first cell of the span the two
+        bodies have in common, so bodies straddling several cells are not
+        reported more than once.
+
+        Args:
+            overlap: only yield pairs with overlapping bounding boxes
+        Usage:
+            grid.update(spheres)
+            for a, b in grid.pairs():
+                if a.collides_with(b):
+                    a.resolve_collision(b)
+        """
+        spans = self._spans
+        for key, bucket in self._grid.items():
+            if len(bucket) < 2:
+                continue
+            bodies = list(bucket)
+            for i, a in enumerate(bodies):
+                span_a = spans[a]
+                for b in bodies[i + 1 :]:
+                    span_b = spans[b]
+                    if key != self._hash(max(span_a[0], span_b[0]), max(span_a[1], span_b[1])):
+                        continue
+                    if overlap and not self._overlaps(a, b):
+                        continue
+                    yield a, b
+
+    @staticmethod
+    def _overlaps(a, b):
+        pos_a = a.pos
+        pos_b = b.pos
+        reach = a.radius + b.radius
+        return abs(pos_a[0] - pos_b[0]) <= reach and abs(pos_a[1] - pos_b[1]) <= reach
+
+    def occupancy(self):
+        """Returns a histogram of bucket sizes, {bodies in bucket: number of buckets}"""
+        return dict(Counter(len(bucket) for bucket in self._grid.values()))
+
+    def stats(self):
+        """Returns the counters from the last update along with grid occupancy
+
+        Usage:
+            grid.update(bodies)
+            print(grid.stats())
+        """
+        return {
+            "bodies": len(self._spans),
+            "buckets": len(self._grid),
+            "moved": self.moved,
+            "rehashed": self.rehashed,
+            "inserted": self.inserted,
+            "removed": self.removed,
+            "occupancy": self.occupancy(),
+        }
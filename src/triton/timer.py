@@ -1,12 +1,23 @@
+import json
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
 from timeit import default_timer as timer
 
 
 class Stopwatch:
-    def __init__(self, label=""):
+    def __init__(self, label="", maxlen=None):
         self.label = label
-        self.samples = []
+        self.maxlen = maxlen
+        self.samples = self._buffer()
         self.start()
 
+    def _buffer(self):
+        if self.maxlen is None:
+            return []
+        return deque(maxlen=self.maxlen)
+
     def start(self):
         self._start = timer()
 
@@ -15,6 +26,29 @@ class Stopwatch:
         self.samples.append(self._stop - self._start)
         self.start()
 
+    def add(self, sample):
+        self.samples.append(sample)
+
+    def percentile(self, p):
+        """Returns the p-th percentile (0-100) of the samples, nearest rank"""
+        ordered = sorted(self.samples)
+        rank = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+        return ordered[rank]
+
+    def summary(self):
+        n = len(self.samples)
+        if n == 0:
+            return {"N": 0}
+        return {
+            "N": n,
+            "min": min(self.samples),
+            "max": max(self.samples),
+            "avg": sum(self.samples) / n,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
     def report(self):
         print(
             "min: {}, max: {}, avg: {}, N: {}".format(
@@ -24,4 +58,98 @@ class Stopwatch:
                 len(self.samples),
             )
         )
-        self.samples = []
+        self.samples = self._buffer()
+
+
+class Profiler:
+    """Collects timings and counts from the engine into ring buffers
+
+    Every label gets a Stopwatch keeping the last size samples. The engine
+    checks the enabled flag before taking any measurement, so a disabled
+    profiler costs one attribute lookup per instrumented call.
+
+    Usage:
+        from triton.timer import profiler
+
+        profiler.enable()
+        registry.process()
+        print(profiler.stats())
+        profiler.export_chrome_trace("trace.json")
+    """
+
+    def __init__(self, size=1000):
+        self.enabled = False
+        self.size = size
+        self.watches = {}
+        self._trace = deque(maxlen=size * 10)
+        self._origin = timer()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.watches = {}
+        self._trace.clear()
+
+    def _watch(self, label):
+        watch = self.watches.get(label)
+        if watch is None:
+            watch = self.watches[label] = Stopwatch(label, maxlen=self.size)
+        return watch
+
+    def record(self, label, start, end=None):
+        """Records a timing sample for a section that began at start"""
+        if end is None:
+            end = timer()
+        self._watch(label).add(end - start)
+        self._trace.append(("X", label, start, end - start, threading.get_ident()))
+
+    def count(self, label, value=1):
+        """Records a count sample, such as the number of receivers of an event"""
+        self._watch(label).add(value)
+        self._trace.append(("C", label, timer(), value, threading.get_ident()))
+
+    @contextmanager
+    def section(self, label):
+        if not self.enabled:
+            yield
+            return
+        start = timer()
+        try:
+            yield
+        finally:
+            self.record(label, start)
+
+    def stats(self):
+        """Returns {label: summary} for every label with samples"""
+        return {label: watch.summary() for label, watch in self.watches.items()}
+
+    def export_chrome_trace(self, path):
+        """Writes the recorded samples as a Chrome trace event file
+
+        The file can be opened in chrome://tracing or Perfetto.
+        """
+        pid = os.getpid()
+        events = []
+        for phase, label, start, value, tid in self._trace:
+            event = {
+                "name": label,
+                "ph": phase,
+                "ts": (start - self._origin) * 1e6,
+                "pid": pid,
+                "tid": tid,
+            }
+            if phase == "X":
+                event["dur"] = value * 1e6
+            else:
+                event["args"] = {"value": value}
+            events.append(event)
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+profiler = Profiler()
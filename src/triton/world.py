@@ -20,11 +20,15 @@
 
 
 from triton.vector3d import Vector3d
+from triton.rigidbody2d import RigidBody2d
+from triton.body_array import BodyArray
+from triton.timer import profiler, timer
 
 
 class World(object):
     def __init__(self):
         self._bodies = []
+        self._body_array = BodyArray()
         self._gravity = Vector3d(0, 9.81, 0)
         self._time = 0
         self._time_slice = 0.1
@@ -37,18 +41,33 @@ class World(object):
     def gravity(self, gravity):
         self._gravity = gravity
 
+    @property
+    def body_array(self):
+        return self._body_array
+
     def add_body(self, body):
         body.world = self
         self._bodies.append(body)
+        if isinstance(body, RigidBody2d):
+            self._body_array.add(body)
+
+    def remove_body(self, body):
+        self._bodies.remove(body)
+        if isinstance(body, RigidBody2d):
+            self._body_array.remove(body)
+        body.world = None
 
     def update(self):
+        start = timer() if profiler.enabled else None
+        self._body_array.update(self._time, self._time_slice)
         for body in self._bodies:
-            body.update(self._time, self._time_slice)
+            if not isinstance(body, RigidBody2d):
+                body.update(self._time, self._time_slice)
+        if start is not None:
+            profiler.record("world.update", start)
 
 
 def main():
-    from triton.rigidbody2d import RigidBody2d
-
     world = World()
     world.gravity = Vector3d(0, 9.81, 0)
     world.add_body(RigidBody2d())
@@ -0,0 +1,243 @@
+import fixtures
+
+import random
+
+import numpy as np
+
+from triton.behavior import (
+    RUNNING,
+    SUCCESS,
+    BatchTree,
+    Blackboard,
+    CompiledTree,
+    EventTree,
+    Guard,
+    Node,
+    Parallel,
+    Repeater,
+    Selector,
+    Sequence,
+    Status,
+    VectorNode,
+)
+
+STATUSES = (Status.Success, Status.Running, Status.Failed)
+
+
+class Scripted(Node):
+    """Returns the statuses of its script in turn, logging every call"""
+
+    def __init__(self, script, log, **kwargs):
+        super().__init__(**kwargs)
+        self.script = script
+        self.log = log
+
+    def start(self, bb):
+        self.log.append((self.name, "start"))
+
+    def update(self, bb):
+        n = bb.get("n", 0)
+        bb["n"] = n + 1
+        self.log.append((self.name, "update", n))
+        return self.script[n % len(self.script)]
+
+    def end(self, bb):
+        self.log.append((self.name, "end"))
+
+
+class Counted(Sequence):
+    """A sequence with its own update, run as a leaf by compiled trees"""
+
+    def update(self, bb):
+        bb["count"] = bb.get("count", 0) + 1
+        return super().update(bb)
+
+
+def random_tree(rng, log, depth=0):
+    if depth > 2 or rng.random() < 0.3:
+        script = [rng.choice(STATUSES) for _ in range(rng.randint(1, 4))]
+        return Scripted(script, log, name="leaf-{}".format(rng.random()))
+    cls = rng.choice((Sequence, Selector, Parallel, Repeater, Counted))
+    children = [random_tree(rng, log, depth + 1) for _ in range(rng.randint(1, 4))]
+    return cls(children=children)
+
+
+def test_compiled_tree_matches_tree():
+    rng = random.Random(3)
+    for _ in range(50):
+        log = []
+        root = random_tree(rng, log)
+        bb = {}
+        expected = [root.tick(bb) for _ in range(12)]
+        expected_log = list(log)
+
+        del log[:]
+        tree = CompiledTree(root)
+        state = tree.new_state()
+        assert [tree.tick(state) for _ in range(12)] == expected
+        assert log == expected_log
+
+
+def test_compiled_tree_state():
+    log = []
+    slow = Scripted([Status.Running, Status.Success], log, name="slow")
+    root = Sequence(children=[Selector(children=[Scripted([Status.Failed], log), slow])])
+    tree = CompiledTree(root)
+    assert tree.kinds == [1, 2, 0, 0]
+    assert tree.size == 6
+
+    states = [tree.new_state() for _ in range(3)]
+    assert [tree.tick(state) for state in states] == [Status.Running] * 3
+    assert tree.status(states[0], slow) == Status.Running
+    assert tree.tick(states[0]) == Status.Success
+    assert states[0].data[1] == {"n": 2}
+    assert tree.status(states[1], slow) == Status.Running
+
+
+class Approach(VectorNode):
+    """Moves every agent one step closer, until its distance is zero"""
+
+    def start_batch(self, columns, agents):
+        columns["starts"][agents] += 1
+
+    def update_batch(self, columns, agents):
+        distance = columns["distance"]
+        distance[agents] = np.maximum(distance[agents] - 1, 0)
+        return np.where(distance[agents] > 0, RUNNING, SUCCESS)
+
+
+def test_batch_tree_matches_compiled_tree():
+    rng = random.Random(5)
+    for _ in range(30):
+        log = []
+        root = random_tree(rng, log)
+        tree = CompiledTree(root)
+        states = [tree.new_state() for _ in range(4)]
+        expected = [[tree.tick(state) for state in states] for _ in range(8)]
+
+        batched = BatchTree(root)
+        batch = batched.new_batch(4)
+        statuses = [batched.tick_batch(batch).tolist() for _ in range(8)]
+        assert [[STATUSES[s] for s in tick] for tick in statuses] == expected
+        assert batch.slots.tolist() == [state.slots for state in states]
+
+
+def test_vector_leaves():
+    log = []
+    root = Sequence(
+        children=[Approach(), Scripted([Status.Success], log, name="arrived"), Approach()]
+    )
+    tree = BatchTree(root)
+    batch = tree.new_batch(3, distance=np.array([1.0, 2.0, 3.0]), starts=np.zeros(3, int))
+
+    assert tree.tick_batch(batch).tolist() == [SUCCESS, RUNNING, RUNNING]
+    assert log == [("arrived", "start"), ("arrived", "update", 0), ("arrived", "end")]
+    assert tree.tick_batch(batch, [1, 2]).tolist() == [SUCCESS, RUNNING]
+    assert tree.tick_batch(batch).tolist() == [SUCCESS, SUCCESS, SUCCESS]
+    assert batch.columns["starts"].tolist() == [4, 4, 2]
+    assert len(log) == 15
+
+
+def test_event_tree_matches_compiled_tree():
+    rng = random.Random(7)
+    for _ in range(50):
+        log = []
+        root = random_tree(rng, log)
+        tree = CompiledTree(root)
+        state = tree.new_state()
+        expected = [tree.tick(state) for _ in range(12)]
+        expected_log = list(log)
+
+        del log[:]
+        event_tree = EventTree(root)
+        event_state = event_tree.new_state()
+        assert [event_tree.tick(event_state) for _ in range(12)] == expected
+        assert log == expected_log
+        assert event_state.slots == state.slots
+
+
+def test_event_tree_resumes_running_leaves():
+    log = []
+    walk = Scripted([Status.Running] * 3 + [Status.Success], log, name="walk")
+    root = Sequence(children=[Sequence(children=[Scripted([Status.Success], log), walk])])
+    tree = EventTree(root)
+    state = tree.new_state()
+    assert [tree.tick(state) for _ in range(4)] == [Status.Running] * 3 + [Status.Success]
+    assert tree.stats == {"full": 1, "resumed": 3, "aborts": 0}
+    assert state.frontier == []
+
+
+def test_guard_aborts():
+    log = []
+    attack = Scripted([Status.Running], log, name="attack")
+    patrol = Scripted([Status.Running], log, name="patrol")
+    root = Selector(
+        children=[
+            Guard(lambda bb: bb["enemy"], attack, keys=["enemy"], abort="both"),
+            patrol,
+        ]
+    )
+    tree = EventTree(root)
+    state = tree.new_state({"enemy": False, "weather": "rain"})
+
+    tree.tick(state)
+    assert state.frontier == [tree.ids[patrol]]
+    state.blackboard["weather"] = "sun"
+    tree.tick(state)
+    assert tree.stats["full"] == 1
+
+    # a lower priority branch is aborted when the guard holds
+    state.blackboard["enemy"] = True
+    tree.tick(state)
+    assert tree.status(state, patrol) == Status.Failed
+    assert tree.status(state, attack) == Status.Running
+    assert ("patrol", "end") in log
+
+    # the guarded child is aborted when the guard fails
+    del log[:]
+    state.blackboard["enemy"] = False
+    assert tree.tick(state) == Status.Running
+    assert log == [("attack", "end"), ("patrol", "start"), ("patrol", "update", 2)]
+    assert tree.stats == {"full": 3, "resumed": 1, "aborts": 2}
+
+
+def test_blackboard_records_changes():
+    bb = Blackboard(a=1, b=2, c=3)
+    assert bb.changed == set()
+    bb.update({"a": 4}, d=5)
+    del bb["b"]
+    bb.setdefault("a", 0)
+    bb.setdefault("e", 6)
+    bb.pop("x", None)
+    assert bb.changed == {"a", "b", "d", "e"}
+
+    bb.changed.clear()
+    bb.pop("c")
+    bb |= {"f": 7}
+    assert bb.changed == {"c", "f"}
+    bb.clear()
+    assert bb.changed == {"a", "c", "d", "e", "f"}
+
+
+def test_guard_aborts_on_update_and_del():
+    log = []
+    attack = Scripted([Status.Running], log, name="attack")
+    root = Selector(
+        children=[
+            Guard(lambda bb: bb.get("enemy", False), attack, keys=["enemy"]),
+            Scripted([Status.Running], log, name="patrol"),
+        ]
+    )
+    tree = EventTree(root)
+    state = tree.new_state({"enemy": True})
+    tree.tick(state)
+    del state.blackboard["enemy"]
+    tree.tick(state)
+    assert ("attack", "end") in log and tree.status(state, attack) == Status.Failed
+
+    state = tree.new_state({"enemy": True})
+    tree.tick(state)
+    state.blackboard.update(enemy=False)
+    tree.tick(state)
+    assert tree.status(state, attack) == Status.Failed
+    assert tree.stats["aborts"] == 2
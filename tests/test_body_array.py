@@ -0,0 +1,90 @@
+import fixtures
+
+from pytest import approx, raises
+
+from triton.vector2d import Vector2d
+from triton.vector3d import Vector3d
+from triton.sphere import Sphere
+from triton.rectangle import Rectangle
+from triton.body_array import BodyArray
+from triton.world import World
+
+
+def make_bodies():
+    bodies = []
+    for i in range(5):
+        sphere = Sphere(
+            mass=1.0 + i,
+            radius=2.0 + i,
+            pos=Vector2d(10.0 * i, 5.0),
+            vel=Vector2d(1.0, -1.0 * i),
+            damping=0.01 * i,
+        )
+        sphere.gravity = Vector3d(0, 9.81, 0)
+        sphere.apply_force(sphere.pos + Vector2d(0, 1), Vector2d(1.0 * i, 2.0))
+        bodies.append(sphere)
+    bodies.append(Rectangle(mass=2.0, dimensions=Vector2d(4, 2), pos=Vector2d(3, 4), dtheta=0.5))
+    return bodies
+
+
+def test_batched_update_matches_per_body_update():
+    reference = make_bodies()
+    bodies = make_bodies()
+    array = BodyArray(capacity=2)
+    for body in bodies:
+        array.add(body)
+
+    for step in range(10):
+        for body in reference:
+            body.update(0, 0.1)
+        array.update(0, 0.1)
+
+    for expected, body in zip(reference, bodies):
+        assert list(body.pos) == approx(list(expected.pos))
+        assert list(body.vel) == approx(list(expected.vel))
+        assert body.theta == approx(expected.theta)
+        assert body.dtheta == approx(expected.dtheta)
+
+
+def test_body_is_a_view_onto_its_row():
+    array = BodyArray()
+    sphere = Sphere(mass=2.0, radius=1.0, pos=Vector2d(1, 2))
+    index = array.add(sphere)
+
+    sphere.pos = Vector2d(5, 6)
+    sphere.mass = 4.0
+    sphere.apply_force_to_com(Vector2d(8, 0))
+    assert list(array.state[index, 3:5]) == [5, 6]
+    assert array.mass[index] == 4.0
+
+    array.update(0, 1.0)
+    assert sphere.vel.x == approx(2.0)
+    assert list(array.force[index]) == [0, 0]
+
+
+def test_remove_moves_last_row():
+    array = BodyArray()
+    spheres = [Sphere(pos=Vector2d(i, i)) for i in range(3)]
+    for sphere in spheres:
+        array.add(sphere)
+
+    array.remove(spheres[0])
+    assert len(array) == 2
+    assert spheres[2]._index == 0
+    assert spheres[2].pos == (2, 2)
+    assert spheres[0].pos == (0, 0)
+
+    spheres[0].pos = Vector2d(7, 7)
+    assert spheres[2].pos == (2, 2)
+
+    with raises(ValueError):
+        array.remove(spheres[0])
+
+
+def test_world_integrates_rigid_bodies_in_one_pass():
+    world = World()
+    sphere = Sphere(pos=Vector2d(0, 0), vel=Vector2d(1, 0))
+    world.add_body(sphere)
+    world.update()
+    assert sphere.x == approx(0.1)
+    assert world.body_array[0] is sphere
@@ -0,0 +1,63 @@
+import random
+
+import fixtures
+
+from triton.vector2d import Vector2d
+from triton.sphere import Sphere
+from triton.broadphase import (
+    SweepAndPrune,
+    SpatialHashBroadPhase,
+    body_bounds,
+    sphere_collisions,
+)
+
+
+def random_spheres(n, seed=1):
+    rng = random.Random(seed)
+    return [
+        Sphere(
+            radius=rng.uniform(2.0, 20.0),
+            pos=Vector2d(rng.uniform(-200.0, 800.0), rng.uniform(-200.0, 800.0)),
+        )
+        for i in range(n)
+    ]
+
+
+def brute_force(spheres):
+    return {
+        (i, j)
+        for i in range(len(spheres))
+        for j in range(i + 1, len(spheres))
+        if spheres[i].collides_with(spheres[j])
+    }
+
+
+def as_set(pairs):
+    return set(map(tuple, pairs.tolist()))
+
+
+def test_sweep_and_prune_matches_brute_force():
+    spheres = random_spheres(300)
+    assert as_set(sphere_collisions(spheres)) == brute_force(spheres)
+
+
+def test_spatial_hash_backend_matches_brute_force():
+    spheres = random_spheres(300, seed=2)
+    pairs = sphere_collisions(spheres, SpatialHashBroadPhase(grid_size=30))
+    assert as_set(pairs) == brute_force(spheres)
+
+
+def test_broad_phase_reports_box_overlaps():
+    spheres = [
+        Sphere(radius=1.0, pos=Vector2d(0, 0)),
+        Sphere(radius=1.0, pos=Vector2d(1.9, 1.9)),
+        Sphere(radius=1.0, pos=Vector2d(5, 0)),
+    ]
+    positions, radii = body_bounds(spheres)
+    assert as_set(SweepAndPrune().find_pairs(positions, radii)) == {(0, 1)}
+    assert len(sphere_collisions(spheres)) == 0
+
+
+def test_no_pairs():
+    assert len(sphere_collisions([])) == 0
+    assert len(sphere_collisions(random_spheres(1))) == 0
@@ -0,0 +1,242 @@
+import fixtures
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from triton.ecs import Registry, Component, Event, System, Scheduler, numeric_component
+
+
+class Position(Component):
+    def __init__(self, x=0):
+        self.x = x
+
+
+class Velocity(Component):
+    def __init__(self, dx=0):
+        self.dx = dx
+
+
+class Tag(Component):
+    pass
+
+
+@numeric_component
+class Point(Component):
+    x: float = 0.0
+    y: float = 0.0
+
+
+@numeric_component
+class Speed(Component):
+    dx: float
+    dy: float
+
+
+def test_get_components():
+    regs = Registry()
+    e1 = regs.add_entity(Position(1), Velocity(2))
+    e2 = regs.add_entity(Position(3))
+    e3 = regs.add_entity(Velocity(4), Position(5), Tag())
+
+    found = {e: (p.x, v.dx) for e, (p, v) in regs.get_components(Position, Velocity)}
+    assert found == {e1: (1, 2), e3: (5, 4)}
+    assert regs.get_entities(Position) == {e1, e2, e3}
+    assert regs.get_entities(Tag, Velocity) == {e3}
+    assert regs.get_entity(e2, Position, Velocity)[1] is None
+
+
+def test_cached_query_follows_component_changes():
+    regs = Registry()
+    e1 = regs.add_entity(Position(1))
+    query = regs.query(Position, Tag)
+    assert list(query) == []
+
+    regs.add_component(e1, Tag())
+    assert [e for e, _ in query] == [e1]
+    assert regs.query(Position, Tag) is query
+
+    regs.remove_component(e1, Tag)
+    assert list(query) == []
+    assert regs.get_entities(Position) == {e1}
+
+
+def test_replace_and_remove():
+    regs = Registry()
+    e1 = regs.add_entity(Position(1))
+    e2 = regs.add_entity(Position(2))
+    e3 = regs.add_entity(Position(3))
+    regs.add_component(e2, Position(20))
+    regs.remove_entity(e1)
+
+    assert {e: p.x for e, (p,) in regs.get_components(Position)} == {e2: 20, e3: 3}
+    assert regs.get_entity(e3, Position)[0].x == 3
+
+
+def test_modify_while_iterating():
+    regs = Registry()
+    for i in range(5):
+        regs.add_entity(Position(i))
+
+    visited = []
+    for e, (p,) in regs.get_components(Position):
+        visited.append(e)
+        regs.add_component(e, Tag())
+
+    assert len(visited) == 5
+    assert len(regs.get_entities(Position, Tag)) == 5
+
+
+def test_numeric_component_fields():
+    p = Point(1.0, y=2.0)
+    assert (p.x, p.y) == (1.0, 2.0)
+    assert Speed().dx == 0.0
+
+    regs = Registry()
+    e1 = regs.add_entity(p)
+    p.x = 5.0
+    assert regs.get_entity(e1, Point)[0].x == 5.0
+
+    regs.add_component(e1, Tag())
+    assert (p.x, p.y) == (5.0, 2.0)
+    regs.remove_entity(e1)
+    assert (p.x, p.y) == (5.0, 2.0)
+
+
+def test_numeric_columns():
+    regs = Registry()
+    points = []
+    for i in range(40):
+        points.append(Point(float(i), 0.0))
+        regs.add_entity(points[-1], Speed(1.0, 2.0))
+    regs.add_entity(Point(100.0, 0.0))
+    regs.add_component(1, Tag())
+    regs.remove_entity(2)
+
+    total = 0
+    for batch in regs.get_columns(Point, Speed):
+        pos, vel = batch[Point], batch[Speed]
+        pos.x += vel.dx * 0.5
+        pos.y += vel.dy * 0.5
+        total += len(batch)
+
+    assert total == 39
+    assert (points[0].x, points[0].y) == (0.5, 1.0)
+    assert (points[39].x, points[39].y) == (39.5, 1.0)
+    assert points[1].x == 1.0
+    assert regs.get_entity(41, Point)[0].x == 100.0
+
+
+class Ping(Event):
+    __slots__ = ("value",)
+
+    def __init__(self, value=0):
+        self.value = value
+
+
+class Pong(Event):
+    pass
+
+
+class Recorder(System):
+    def __init__(self, batch=False):
+        super().__init__()
+        self.batch = batch
+        self.received = []
+
+    def initialize(self):
+        self.on(Ping, self.received.append, batch=self.batch)
+
+
+class Deaf(System):
+    def initialize(self):
+        self.on(Pong, lambda e: None)
+
+
+def test_events_only_reach_subscribers():
+    regs = Registry()
+    single = regs.add_system(Recorder())
+    batched = regs.add_system(Recorder(batch=True))
+    deaf = regs.add_system(Deaf())
+
+    for i in range(3):
+        single.emit(Ping(i))
+    assert deaf.events == []
+    regs.process()
+
+    assert [e.value for e in single.received] == [0, 1, 2]
+    assert len(batched.received) == 1
+    assert [e.value for e in batched.received[0]] == [0, 1, 2]
+
+
+def test_pooled_events_are_recycled():
+    regs = Registry()
+    first = regs.add_system(Recorder())
+    second = regs.add_system(Recorder())
+    pool = regs.event_pool(Ping)
+
+    ping = pool.acquire(1)
+    first.emit(ping)
+    first._process()
+    assert pool.acquire(2) is not ping
+    second._process()
+    assert pool.acquire(3) is ping
+    assert ping.value == 3
+
+
+def test_pooled_events_released_from_threads():
+    # systems in a parallel stage finish the same events on different threads
+    pool = Registry().event_pool(Ping)
+    pings = [pool.acquire(i) for i in range(2000)]
+    for ping in pings:
+        pool._hold(ping, 4)
+
+    def finish():
+        for ping in pings:
+            pool._done(ping)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(4) as executor:
+            for future in [executor.submit(finish) for _ in range(4)]:
+                future.result()
+    finally:
+        sys.setswitchinterval(interval)
+    assert pool._refs == {}
+    assert len(pool._free) == len(pings)
+
+
+class Ticker(System):
+    def __init__(self, reads=None, writes=None, log=None):
+        super().__init__()
+        self.reads = reads
+        self.writes = writes
+        self.log = log
+
+    def initialize(self):
+        self.on(Pong, lambda e: self.log.append((self, e)))
+
+    def _process(self):
+        super()._process()
+        self.emit(Pong())
+
+
+def test_scheduler_stages():
+    regs = Registry()
+    log = []
+    a = regs.add_system(Ticker(reads=(Velocity,), writes=(Position,), log=log))
+    b = regs.add_system(Ticker(reads=(), writes=(Tag,), log=log))
+    c = regs.add_system(Ticker(reads=(Position,), writes=(), log=log))
+    d = regs.add_system(Ticker(log=log))
+    regs.scheduler = Scheduler(threads=2)
+    try:
+        regs.process()
+        assert regs.scheduler.stages == [[a, b], [c], [d]]
+        assert set(regs.scheduler.timings) == {a, b, c, d}
+        assert [name for name, _ in regs.scheduler.report()[0]] == ["Ticker"] * 2
+
+        # events from the parallel stage are delivered in system order
+        assert [s for s, e in log] == [c, c, d, d, d]
+        assert [len(s.events) for s in (a, b, c, d)] == [4, 4, 2, 1]
+    finally:
+        regs.scheduler.shutdown()
@@ -0,0 +1,171 @@
+import fixtures
+
+from triton.goap.action import Action, ActionSet, Agent, Goal, goal_planner
+from triton.goap.planner import Planner, RegressivePlanner
+
+
+class StealOre(Action):
+    preconditions = {"hasOre": False}
+    effects = {"hasOre": True, "hasFun": False}
+    cost = 10.0
+
+
+class MineOre(Action):
+    preconditions = {"hasTool": True, "hasOre": False}
+    effects = {"hasOre": True}
+
+
+class SellOre(Action):
+    preconditions = {"hasOre": True}
+    effects = {"hasOre": False, "needMoney": False}
+
+
+class Drink(Action):
+    preconditions = {"needMoney": False}
+    effects = {"hasFun": True}
+    cost = 2.0
+
+
+class Brawl(Action):
+    preconditions = {"hasFun": False}
+    effects = {"hasFun": True}
+    cost = 20.0
+
+
+class Dwarf(Agent):
+    def init(self):
+        self.state = {"hasTool": False, "hasOre": False, "hasFun": False, "gold": 0}
+        self.actions = [MineOre, StealOre, SellOre, Drink, Brawl]
+
+
+def names(plan):
+    return plan[0], [str(action) for action in plan[1]]
+
+
+def test_astar_finds_cheapest_plan():
+    actions = ActionSet(Dwarf().actions)
+    state = Dwarf().state
+
+    assert names(actions.plan(state, {"hasFun": True})) == (
+        13.0,
+        ["StealOre", "SellOre", "Drink"],
+    )
+    state["hasTool"] = True
+    assert names(actions.plan(state, {"hasFun": True})) == (4.0, ["MineOre", "SellOre", "Drink"])
+    assert actions.plan(state, {"hasFun": False}) == (0.0, [])
+    assert actions.plan(state, {"hasTool": False}) is None
+    # a goal value no action mentions gets its own bit
+    assert actions.plan(state, {"hasOre": "maybe"}) is None
+    assert names(actions.plan(state, {"hasFun": True})) == (4.0, ["MineOre", "SellOre", "Drink"])
+
+
+def test_plan_cache():
+    actions = ActionSet(Dwarf().actions, maxsize=2)
+    state = Dwarf().state
+    for _ in range(3):
+        actions.plan(state, {"hasFun": True})
+    assert (actions.hits, actions.misses) == (2, 1)
+
+    actions.plan(state, {"hasOre": True})
+    actions.plan(state, {"needMoney": False})
+    actions.plan(state, {"hasFun": True})
+    assert (actions.hits, actions.misses) == (2, 4)
+    assert len(actions.plans) == 2
+
+
+def test_goal_planner():
+    gimli = Dwarf()
+    gimli.set_goal(Goal({"hasFun": True}))
+    gimli.set_goal(Goal({"hasOre": True}))
+    assert str(goal_planner(gimli)) == "StealOre"
+
+    gimli.goals = [Goal({"hasFun": False})]
+    assert goal_planner(gimli) is False
+    gimli.goals = [Goal({"hasTool": True})]
+    assert goal_planner(gimli) is False
+
+
+def test_batch_planner():
+    dwarves = [Dwarf() for _ in range(200)]
+    for i, dwarf in enumerate(dwarves):
+        dwarf.state["hasTool"] = i % 2 == 0
+        dwarf.state["gold"] = i
+        dwarf.set_goal(Goal({"hasFun": True}))
+        if i % 3 == 0:
+            dwarf.set_goal(Goal({"hasTool": True}))
+
+    for processes in (0, 2):
+        planner = Planner(Dwarf().actions, processes=processes, chunksize=1)
+        try:
+            plans = planner.plan_agents(dwarves)
+        finally:
+            planner.shutdown()
+        assert [names(plan) for plan in plans[:2]] == [
+            (4.0, ["MineOre", "SellOre", "Drink"]),
+            (13.0, ["StealOre", "SellOre", "Drink"]),
+        ]
+        assert plans[3] == plans[1]
+        assert planner.stats["requests"] == 267
+        assert (planner.stats["unique"], planner.stats["searched"]) == (4, 4)
+
+        planner.plan([dwarves[0].state], [{"hasFun": True}])
+        assert (planner.stats["cached"], planner.stats["searched"]) == (1, 0)
+        assert planner.timings.summary()["N"] == 2
+
+
+class Idle(Action):
+    preconditions = {"awake": True}
+    effects = {"awake": False}
+
+
+def test_regressive_planner():
+    catalogue = Dwarf().actions + [Idle]
+    forward = ActionSet(catalogue)
+    planner = RegressivePlanner(catalogue)
+    for has_tool in (False, True):
+        state = dict(Dwarf().state, hasTool=has_tool, awake=True)
+        for goal in ({"hasFun": True}, {"needMoney": False}, {"hasOre": True, "hasFun": True}):
+            plan = planner.plan(state, goal)
+            assert planner.stats["optimal"]
+            assert plan[0] == forward.plan(state, goal)[0]
+    assert names(plan) == (5.0, ["MineOre", "SellOre", "Drink", "MineOre"])
+    assert planner.plan(state, {"hasFun": False}) == (0.0, [])
+    assert planner.plan(state, {"hasTool": False}) is None
+
+    # out of budget before any plan is found
+    state = Dwarf().state
+    limited = RegressivePlanner(catalogue, max_iterations=1)
+    assert limited.plan(state, {"hasFun": True}) is None
+    assert limited.stats == dict(limited.stats, iterations=2, optimal=False)
+    limited.max_iterations = 5
+    assert names(limited.plan(state, {"hasFun": True})) == (13.0, ["StealOre", "SellOre", "Drink"])
+    assert limited.stats["optimal"]
+
+
+def test_agent_keeps_and_repairs_its_plan():
+    gimli = Dwarf()
+    gimli.state["hasTool"] = True
+    gimli.set_goal(Goal({"hasFun": True}))
+
+    assert str(gimli.next_action()) == "MineOre"
+    assert [str(action) for action in gimli.plan] == ["MineOre", "SellOre", "Drink"]
+    gimli.do_action(gimli.next_action())
+    assert str(gimli.next_action()) == "SellOre"
+
+    # the ore is lost: a bridge back to the plan is searched for
+    gimli.state["hasOre"] = False
+    assert [str(gimli.next_action())] + [str(action) for action in gimli.plan] == [
+        "MineOre",
+        "MineOre",
+        "SellOre",
+        "Drink",
+    ]
+    gimli.do_action(gimli.next_action())
+
+    # money turns up: the plan skips ahead
+    gimli.state.update(hasOre=False, needMoney=False)
+    assert str(gimli.next_action()) == "Drink"
+    gimli.do_action(gimli.next_action())
+    assert gimli.verify_goals()
+    assert gimli.next_action() is False
+    assert gimli.plan_stats == {"plans": 2, "repairs": 2}
@@ -0,0 +1,75 @@
+import json
+
+import fixtures
+
+from triton.timer import Profiler, Stopwatch, profiler
+from triton.ecs import Registry, System, Event
+from triton.world import World
+from triton.sphere import Sphere
+
+
+def test_stopwatch_ring_buffer():
+    watch = Stopwatch(maxlen=10)
+    for i in range(1, 101):
+        watch.add(i)
+    summary = watch.summary()
+    assert summary["N"] == 10
+    assert summary["min"] == 91
+    assert summary["p50"] == 95
+    assert summary["p99"] == 100
+
+
+class Hello(Event):
+    pass
+
+
+class Greeter(System):
+    def initialize(self):
+        self.on(Hello, lambda e: None)
+
+
+def test_engine_profiling(tmp_path):
+    # the engine records to the global profiler, left clean for other tests
+    profiler.clear()
+    try:
+        regs = Registry()
+        greeter = regs.add_system(Greeter())
+        world = World()
+        world.add_body(Sphere())
+
+        greeter.emit(Hello())
+        regs.process()
+        assert profiler.stats() == {}
+
+        profiler.enable()
+        greeter.emit(Hello())
+        regs.process()
+        world.update()
+        profiler.disable()
+
+        stats = profiler.stats()
+        assert stats["registry.process"]["N"] == 1
+        assert stats["system.Greeter"]["N"] == 1
+        assert stats["system.Greeter.events"]["max"] == 1
+        assert stats["event.Hello"]["max"] == 1
+        assert stats["world.update"]["N"] == 1
+
+        path = tmp_path / "trace.json"
+        profiler.export_chrome_trace(str(path))
+        trace = json.loads(path.read_text())
+        assert {e["name"] for e in trace["traceEvents"]} == set(stats)
+    finally:
+        profiler.disable()
+        profiler.clear()
+
+
+def test_section():
+    p = Profiler(size=4)
+    with p.section("off"):
+        pass
+    p.enable()
+    for i in range(6):
+        with p.section("on"):
+            pass
+    assert list(p.stats()) == ["on"]
+    assert p.stats()["on"]["N"] == 4
@@ -19,7 +19,7 @@
 # THE SOFTWARE.
 
 import fixtures
-from triton.rete import Rete, Fact, Cond, Var
+from triton.rete import Rete, Fact, Cond, Var, Token, Not, Exists, Count, Sum, Min, Max
 
 
 class CalledProd:
@@ -188,3 +188,285 @@ def test2():
     net.add_wme(Fact("b", "count", 2)).fire()
     assert callback2.count() == 2
     assert callback3.count() == 1
+
+
+def test_indexed_alpha_network():
+    equal = CalledProd()
+    unhashable = CalledProd()
+    other = CalledProd()
+    net = Rete()
+    net.production(Cond("x", "size", "==", 1), production=equal)
+    net.production(Cond("x", "tags", "==", ["a"]), production=unhashable)
+    net.production(Cond("x", "size", "!=", 1), production=other)
+
+    net.add_wme(Fact("a", "size", 1.0)).fire()
+    assert (equal.count(), other.count()) == (1, 0)
+    net.add_wme(Fact("b", "size", [1])).fire()
+    assert (equal.count(), other.count()) == (1, 1)
+    net.add_wme(Fact("c", "tags", ["a"])).fire()
+    assert unhashable.count() == 1
+    net.add_wme(Fact("d", "weight", 1)).fire()
+    assert (equal.count(), unhashable.count(), other.count()) == (1, 1, 1)
+
+
+def test_hash_indexed_joins():
+    tokens = []
+    net = Rete()
+    net.production(
+        Cond("x", "on", Var("y")),
+        Cond("y", "color", "red"),
+        production=lambda net, token: tokens.append([f.id.bound for f in token]),
+    )
+    for i in range(100):
+        net.add_wme(Fact("block-{}".format(i), "on", "block-{}".format(i + 1)))
+    net.add_wme(Fact("block-50", "color", "red")).fire()
+    assert tokens == [["block-49", "block-50"]]
+
+    net.add_wme(Fact("block-100", "color", "red"))
+    net.add_wme(Fact("block-100", "on", [1])).fire()
+    net.add_wme(Fact("block-101", "on", "block-100")).fire()
+    assert tokens[1:] == [["block-99", "block-100"], ["block-101", "block-100"]]
+
+    alpha = next(n for n in net._alpha_root.children if n.test.attr == "color")
+    join = next(iter(next(iter(alpha.children)).children))
+    assert join.tests == ((0, "value", "id"),)
+    assert len(join.parent.indexes[(0, "value")].get("block-100")) == 2
+
+
+def test_transaction_coalesces_updates():
+    fired = []
+    net = Rete()
+    net.production(
+        Cond("x", "count", ">", 1), production=lambda net, token: fired.append(token[0].value)
+    )
+
+    with net.transaction():
+        net.add_wme(Fact("a", "count", 2))
+        net.add_wme(Fact("a", "count", 3))
+        net.add_wme(Fact("b", "count", 4))
+        net.retract_wme(Fact("b", "count", 4))
+        assert len(net.agenda) == 0
+    net.fire()
+    assert fired == [3]
+
+    net.add_wmes(Fact(i, "count", i) for i in range(5)).fire()
+    assert fired[1:] == [2, 3, 4]
+
+
+def test_nested_transaction_rollback():
+    net = Rete()
+    net.production(Cond("x", "a", Var("y")), production=lambda net, token: None)
+
+    with net.transaction():
+        net.add_wme(Fact("o", "a", "v"))
+        try:
+            with net.transaction():
+                net.add_wme(Fact("i", "a", "v"))
+                net.retract_wme(Fact("o", "a", "v"))
+                raise ValueError()
+        except ValueError:
+            pass
+    assert [str(a.token.wme.id) for a in net.agenda.pending()] == ["o"]
+
+
+def test_agenda_salience_and_recency():
+    fired = []
+    net = Rete(strategy="recency")
+    net.production(Cond("x", "low", Var("y")), production=lambda n, t: fired.append("low"))
+    net.production(
+        Cond("x", "high", Var("y")),
+        production=lambda n, t: fired.append(t[0].id.bound),
+        salience=10,
+    )
+    net.add_wmes([Fact("a", "low", 1), Fact("b", "high", 1), Fact("c", "high", 1)])
+    assert len(net.agenda) == 3
+    net.fire()
+    assert fired == ["c", "b", "low"]
+    assert len(net.agenda) == 0
+
+
+def test_retraction_during_fire():
+    fired = []
+
+    def p1(net, token):
+        fired.append("p1")
+        net.retract_wme(Fact("b", "color", "red"))
+
+    net = Rete()
+    net.production(Cond("x", "on", Var("y")), production=p1, salience=10)
+    net.production(
+        Cond("y", "color", "red"), production=lambda n, t: fired.append("p2"), salience=5
+    )
+    net.add_wmes([Fact("a", "on", "b"), Fact("b", "color", "red")])
+    assert len(net.agenda) == 2
+    net.fire()
+    assert fired == ["p1"]
+    assert len(net.agenda) == 0
+
+
+def test_linked_tokens():
+    fired = []
+    net = Rete()
+    net.production(
+        Cond("x", "on", Var("y")),
+        Cond("y", "on", Var("z")),
+        Cond("z", "color", "red"),
+        production=lambda net, token: fired.append(token),
+    )
+    net.add_wmes([Fact("a", "on", "b"), Fact("b", "on", "c"), Fact("c", "color", "red")]).fire()
+    assert len(fired) == 1
+    assert isinstance(fired[0], list)
+    assert [f.id.bound for f in fired[0]] == ["a", "b", "c"]
+
+    token = Token(Token(None, "a"), "b")
+    assert (len(token), token[0], token[-1], list(token)) == (2, "a", "b", ["a", "b"])
+    shared = Token(token.parent, "c")
+    assert shared[0] is token[0]
+
+
+def test_retraction_deletes_derived_tokens():
+    fired = []
+    net = Rete()
+    net.production(
+        Cond("x", "on", Var("y")),
+        Cond("y", "color", "red"),
+        Cond("y", "size", "big"),
+        production=lambda net, token: fired.append(token[0].id.bound),
+    )
+    net.add_wmes([Fact("a", "on", "b"), Fact("c", "on", "b"), Fact("b", "color", "red")])
+    net.add_wme(Fact("b", "size", "big"))
+    assert len(net.agenda) == 2
+
+    net.retract_wme(Fact("b", "color", "red"))
+    assert len(net.agenda) == 0
+    net.fire()
+    assert fired == []
+    assert all(len(n.tokens) == 0 for n in net._prod_memory.values())
+
+    net.add_wme(Fact("b", "color", "red")).fire()
+    assert sorted(fired) == ["a", "c"]
+
+    net.add_wme(Fact("c", "on", "d"))
+    net.add_wme(Fact("b", "color", "red")).fire()
+    assert fired[2:] == ["a"]
+
+
+def test_bound_ids_replace_wmes():
+    # callbacks get facts with ids bound to variables, and add facts with them
+    net = Rete()
+    net.production(Cond("x", "heater", False), production=lambda net, token: None)
+    net.add_wme(Fact("kitchen", "heater", False))
+    assert len(net.agenda) == 1
+    net.add_wme(Fact(Var("room", "kitchen"), "heater", True))
+    assert len(net.agenda) == 0
+
+    with net.transaction():
+        net.add_wme(Fact("hall", "heater", False))
+        net.add_wme(Fact(Var("room", "hall"), "heater", True))
+    assert len(net.agenda) == 0
+
+
+def test_node_sharing_and_stats():
+    fired = []
+
+    def on_red(net, token):
+        fired.append(str(token[0].id))
+
+    net = Rete()
+    net.production(Cond("x", "on", Var("y")), Cond("y", "color", "red"), production=on_red)
+    net.production(Cond("a", "on", Var("b")), Cond("b", "color", "red"), production=on_red)
+    net.production(Cond("b", "color", "red"), production=on_red)
+    net.add_wmes([Fact("block", "on", "table"), Fact("table", "color", "red")]).fire()
+    assert sorted(fired) == ["Var(a, block)", "Var(b, table)", "Var(x, block)"]
+
+    stats = net.stats()
+    assert stats["nodes"] == {
+        "alpha-node": 2,
+        "alpha-memory-node": 2,
+        "beta-node": 3,
+        "beta-memory-node": 1,
+        "production-node": 3,
+    }
+    assert stats["memory"]["alpha-memory-node"] == 2
+    assert stats["memory"]["production-node"] == 3
+    assert stats["wmes"] == 2 and stats["agenda"] == 0
+    assert sorted(stats["productions"].values()) == ["on_red"] * 3
+    assert net.nodes()[0].name == Rete().nodes()[0].name == "alpha-node_1"
+
+
+def test_shared_alpha_memory_self_join():
+    # both conditions share one alpha memory, and the WME joins with itself
+    for _ in range(20):
+        fired = []
+        net = Rete()
+        net.production(
+            Cond("x", "on", Var("y")),
+            Cond("y", "on", Var("z")),
+            production=lambda net, token: fired.append(token),
+        )
+        net.add_wme(Fact("e", "on", "e")).fire()
+        assert len(fired) == 1
+
+
+def test_negated_and_existential_conds():
+    free, covered = [], []
+    net = Rete()
+    net.production(
+        Cond("x", "is", "block"),
+        Not(Cond("y", "on", Var("x"))),
+        production=lambda net, token: free.append(token[0].id.bound),
+    )
+    net.production(
+        Cond("x", "is", "block"),
+        Exists(Cond("y", "on", Var("x"))),
+        production=lambda net, token: covered.append(token[0].id.bound),
+    )
+    net.add_wmes([Fact("a", "is", "block"), Fact("b", "is", "block"), Fact("c", "on", "a")])
+    net.fire()
+    assert (free, covered) == (["b"], ["a"])
+
+    net.add_wme(Fact("d", "on", "a")).fire()
+    assert (free, covered) == (["b"], ["a"])
+
+    net.retract_wme(Fact("c", "on", "a")).fire()
+    assert (free, covered) == (["b"], ["a"])
+    net.retract_wme(Fact("d", "on", "a")).fire()
+    assert (free, covered) == (["b", "a"], ["a"])
+
+    net.add_wme(Fact("e", "on", "b"))
+    assert len(net.agenda) == 1
+    net.add_wme(Fact("e", "on", "a")).fire()
+    assert (free, covered) == (["b", "a", "b"], ["a", "a"])
+
+
+def test_incremental_aggregates():
+    results = {}
+
+    def record(name):
+        return lambda net, token: results.setdefault(name, []).append(token[1].value)
+
+    net = Rete()
+    table = Cond("t", "is", "table")
+    net.production(table, Count(Cond("b", "on", Var("t")), ">", 1), production=record("count"))
+    for agg in (Sum, Min, Max):
+        net.production(
+            table, agg(Cond("l", "weighs", Var("w"))), production=record(agg.__name__.lower())
+        )
+
+    net.add_wmes([Fact("t1", "is", "table"), Fact("b1", "on", "t1")]).fire()
+    assert results == {}
+    net.add_wme(Fact("b2", "on", "t1")).fire()
+    assert results == {"count": [2]}
+
+    net.add_wmes([Fact("l1", "weighs", 4), Fact("l2", "weighs", 9), Fact("l3", "weighs", 2)])
+    net.fire()
+    assert (results["sum"], results["min"], results["max"]) == ([15], [2], [9])
+    net.retract_wme(Fact("l2", "weighs", 9)).fire()
+    assert (results["sum"], results["min"], results["max"]) == ([15, 6], [2], [9, 4])
+    net.add_wme(Fact("l1", "weighs", 1)).fire()
+    assert (results["sum"], results["min"], results["max"]) == ([15, 6, 3], [2, 1], [9, 4, 2])
+
+    net.retract_wme(Fact("b1", "on", "t1")).fire()
+    net.add_wme(Fact("b1", "on", "t1")).fire()
+    assert results["count"] == [2, 2]
+    assert net.stats()["nodes"]["aggregate-node"] == 4
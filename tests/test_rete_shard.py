@@ -0,0 +1,80 @@
+import fixtures
+
+from triton.rete import Rete, Fact, Cond, Var, Not, Count
+from triton.rete_shard import ShardedRete, id_local
+
+
+def add_productions(net, log):
+    net.production(
+        Cond("x", "color", "red"),
+        Cond("x", "size", ">", 1),
+        production=lambda net, token: log.append(("big", token[0].id.bound)),
+    )
+    net.production(
+        Cond("x", "color", "red"),
+        Not(Cond("x", "size", ">", 0)),
+        production=lambda net, token: log.append(("flat", token[0].id.bound)),
+        salience=1,
+    )
+    net.production(
+        Cond("x", "on", Var("y")),
+        Cond("y", "color", "red"),
+        production=lambda net, token: log.append(("on", token[0].id.bound, token[1].id.bound)),
+    )
+
+
+def facts(n):
+    for i in range(n):
+        yield Fact("b{}".format(i), "color", "red" if i % 2 else "blue")
+        yield Fact("b{}".format(i), "size", i // 2 % 3 * 2)
+        yield Fact("b{}".format(i), "on", "b{}".format(i + 1))
+
+
+def test_id_local():
+    assert id_local([Cond("x", "color", "red")])
+    assert id_local([Cond("x", "color", "red"), Count(Cond("x", "tag", "a"), ">", 1)])
+    assert not id_local([Cond("x", "on", Var("y")), Cond("y", "color", "red")])
+    assert not id_local([Cond("x", "color", "red"), Not(Cond("y", "color", "blue"))])
+
+
+def test_sharded_matches_single_network():
+    expected = []
+    net = Rete()
+    add_productions(net, expected)
+    net.add_wmes(facts(40)).fire()
+
+    log = []
+    with ShardedRete(shards=3) as sharded:
+        add_productions(sharded, log)
+        assert len(sharded._rules) == 2
+        sharded.add_wmes(facts(40))
+        assert log == []
+        sharded.fire()
+        assert sorted(log) == sorted(expected)
+        # the salience 1 production fires first
+        flat = [entry for entry in log if entry[0] == "flat"]
+        assert len(flat) == 7 and log[:7] == flat
+
+        del log[:]
+        sharded.retract_wme(Fact("b3", "size", 2))
+        sharded.add_wme(Fact("b5", "size", 0))
+        sharded.add_wme(Fact("b2", "color", "red"))
+        sharded.fire()
+        assert sorted(log) == [("big", "b2"), ("flat", "b3"), ("flat", "b5"), ("on", "b1", "b2")]
+
+
+def test_sharded_nested_transaction_rollback():
+    log = []
+    with ShardedRete(shards=2) as sharded:
+        add_productions(sharded, log)
+        with sharded.transaction():
+            sharded.add_wme(Fact("o", "color", "red"))
+            try:
+                with sharded.transaction():
+                    sharded.add_wme(Fact("i", "color", "red"))
+                    sharded.retract_wme(Fact("o", "color", "red"))
+                    raise ValueError()
+            except ValueError:
+                pass
+        sharded.fire()
+        assert log == [("flat", "o")]
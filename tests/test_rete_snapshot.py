@@ -0,0 +1,104 @@
+import fixtures
+
+import pytest
+
+from triton import rete_snapshot
+from triton.rete import Rete, Fact, Cond, Var, Not, Count, debug_production
+
+
+def build(log):
+    net = Rete(strategy="recency")
+    net.production(
+        Cond("x", "on", Var("y")),
+        Cond("y", "color", "red"),
+        production=lambda net, token: log.append([str(f) for f in token]),
+        salience=5,
+    )
+    net.production(Cond("x", "size", ">", 2), production=debug_production)
+    net.add_wmes(
+        [
+            Fact("a", "on", "b"),
+            Fact("c", "on", "b"),
+            Fact("b", "color", "red"),
+            Fact("a", "size", 3),
+            Fact("big", "size", 2**70),
+            Fact("b", "tags", ("x", [1.5, None])),
+        ]
+    )
+    return net
+
+
+def test_snapshot_roundtrip(tmp_path, capsys):
+    log = []
+    net = build(log)
+    path = str(tmp_path / "net.rete")
+    net.save(path)
+
+    with pytest.raises(ValueError):
+        Rete.load(path)
+
+    loaded_log = []
+    loaded = Rete.load(
+        path, callbacks={"<lambda>": lambda n, t: loaded_log.append([str(f) for f in t])}
+    )
+    assert loaded.stats()["nodes"] == net.stats()["nodes"]
+    assert loaded.stats()["memory"] == net.stats()["memory"]
+    assert [n.name for n in loaded.nodes()] == [n.name for n in net.nodes()]
+    assert len(loaded.agenda) == len(net.agenda) == 4
+
+    net.fire()
+    loaded.fire()
+    assert loaded_log == log
+    assert len(log) == 2
+    assert capsys.readouterr().out.count("PROD:") == 4
+
+    # the loaded network keeps matching and retracting
+    for n, l in ((net, log), (loaded, loaded_log)):
+        n.retract_wme(Fact("b", "color", "red"))
+        n.add_wme(Fact("d", "on", "e")).add_wme(Fact("e", "color", "red")).fire()
+        assert l[2:] == [["Fact(Var(x, d), on, Var(y, e))", "Fact(Var(y, e), color, red)"]]
+    assert loaded.stats()["memory"] == net.stats()["memory"]
+
+
+def test_snapshot_values_and_versions(tmp_path):
+    value = [None, True, -1, 2**70, 0.5, "ø", b"\0", ("x", [Var("y", 1)])]
+    out = bytearray()
+    rete_snapshot.encode_value(value, out)
+    assert rete_snapshot.decode_value(bytes(out), 0) == (value, len(out))
+    with pytest.raises(TypeError):
+        rete_snapshot.encode_value({}, bytearray())
+
+    path = tmp_path / "other"
+    path.write_bytes(b"not a snapshot at all")
+    with pytest.raises(ValueError):
+        Rete.load(str(path))
+
+
+def test_snapshot_negation_and_aggregates(tmp_path):
+    def build_rules(net, log):
+        net.production(
+            Cond("x", "is", "block"),
+            Not(Cond("y", "on", Var("x"))),
+            production=lambda net, token: log.append(("free", token[0].id.bound)),
+        )
+        net.production(
+            Cond("x", "is", "block"),
+            Count(Cond("y", "on", Var("x")), ">=", 2),
+            production=lambda net, token: log.append(("count", token[1].value)),
+        )
+
+    log = []
+    net = Rete()
+    build_rules(net, log)
+    net.add_wmes([Fact("a", "is", "block"), Fact("b", "is", "block"), Fact("c", "on", "a")])
+    path = str(tmp_path / "net.rete")
+    net.save(path)
+
+    loaded = Rete.load(path, callbacks={"<lambda>": lambda n, t: None})
+    for node in loaded._prod_memory.values():
+        node.callback = net._prod_memory[node.name].callback
+    for n in (net, loaded):
+        n.fire()
+        n.add_wme(Fact("d", "on", "a")).fire()
+        n.retract_wme(Fact("c", "on", "a")).retract_wme(Fact("d", "on", "a")).fire()
+    assert log == [("free", "b"), ("count", 2), ("free", "a")] * 2
@@ -0,0 +1,71 @@
+import fixtures
+
+from triton.vector2d import Vector2d
+from triton.sphere import Sphere
+from triton.spatial_hash import SpatialHash
+
+
+def test_negative_cells_are_not_folded():
+    grid = SpatialHash(grid_size=10)
+    a = Sphere(radius=1.0, pos=Vector2d(-795.0, 5.0))
+    b = Sphere(radius=1.0, pos=Vector2d(5.0, 5.0))
+    grid.update([a, b])
+    assert list(grid.nearby_objects(a)) == []
+    assert list(grid.nearby_objects(b)) == []
+
+
+def test_incremental_update_only_moves_changed_bodies():
+    grid = SpatialHash(grid_size=10)
+    spheres = [Sphere(radius=1.0, pos=Vector2d(5.0 + 20 * i, 5.0)) for i in range(4)]
+    grid.update(spheres)
+    assert grid.stats()["inserted"] == 4
+
+    spheres[0].pos = Vector2d(6.0, 6.0)
+    spheres[1].pos = Vector2d(45.0, 5.0)
+    grid.update(spheres)
+    stats = grid.stats()
+    assert stats["inserted"] == 0
+    assert stats["moved"] == 1
+    assert stats["rehashed"] == 2
+    assert list(grid.nearby_objects(spheres[2])) == [spheres[1]]
+    assert list(grid.nearby_objects(spheres[1])) == [spheres[2]]
+
+
+def test_missing_bodies_are_removed():
+    grid = SpatialHash(grid_size=10)
+    a = Sphere(radius=1.0, pos=Vector2d(5.0, 5.0))
+    b = Sphere(radius=1.0, pos=Vector2d(6.0, 5.0))
+    grid.update([a, b])
+    grid.update([a])
+    assert grid.stats()["removed"] == 1
+    assert list(grid.nearby_objects(a)) == []
+    assert grid.occupancy() == {1: 1}
+
+
+def test_occupancy_histogram():
+    grid = SpatialHash(grid_size=10)
+    grid.update(
+        [
+            Sphere(radius=1.0, pos=Vector2d(5.0, 5.0)),
+            Sphere(radius=1.0, pos=Vector2d(4.0, 4.0)),
+            Sphere(radius=6.0, pos=Vector2d(30.0, 30.0)),
+        ]
+    )
+    assert grid.occupancy() == {2: 1, 1: 4}
+
+
+def test_pairs_are_reported_once():
+    grid = SpatialHash(grid_size=10)
+    a = Sphere(radius=8.0, pos=Vector2d(10.0, 10.0))
+    b = Sphere(radius=8.0, pos=Vector2d(15.0, 12.0))
+    c = Sphere(radius=0.5, pos=Vector2d(1.0, 1.0))
+    grid.update([a, b, c])
+
+    assert list(grid.nearby_objects(a)) == [b, c]
+    assert list(grid.pairs()) == [(a, b)]
+    assert {frozenset(p) for p in grid.pairs(overlap=False)} == {
+        frozenset((a, b)),
+        frozenset((a, c)),
+        frozenset((b, c)),
+    }
+    assert list(grid.query_pairs(a)) == [(a, b)]